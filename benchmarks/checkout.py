@@ -0,0 +1,148 @@
+"""
+Benchmark for the checkout engine.
+
+Concurrent attendants sell from the same small set of products and the
+throughput in sales per second is reported, followed by a check that no
+stock update was lost. --batch N sends the sales of each attendant N at
+a time through the batch checkout used by offline tills. --legacy runs
+the same load through the previous read-modify-write flow, which opened
+a connection per query, for comparison. Run it against a scratch
+database configured through the usual DATABASE_* environment variables,
+and raise DATABASE_POOL_MAX to at least the number of attendants:
+
+    python -m benchmarks.checkout --attendants 8 --sales 200
+"""
+import argparse
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+from storemanager.api.v2.database.database import DB
+from storemanager.api.v2.database.migrations import migrate
+from storemanager.api.v2.database.queries import *
+from storemanager.api.v2.models.checkout import create_sale, create_sales
+
+GET_BENCH_STOCK = """
+    SELECT name, stock
+    FROM products
+    WHERE name = ANY(%s)"""
+
+LEGACY_UPDATE_STOCK = """
+    UPDATE products
+    SET stock = %s
+    WHERE id = %s"""
+
+
+def seed(products, stock):
+    """create an attendant, a category and products unique to this run"""
+    prefix = 'bench-{}'.format(uuid.uuid4().hex[:8])
+    with DB.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(CREATE_USER, (prefix, 'secret', 'attendant'))
+        attendant_id = cur.fetchone()[0]
+        cur.execute(CREATE_CATEGORY, (prefix, 'benchmark products'))
+        category_id = cur.fetchone()[0]
+        names = []
+        for i in range(products):
+            name = '{}-{}'.format(prefix, i)
+            cur.execute(CREATE_PRODUCT, (name, 100, stock, 0,
+                                         'benchmark product', category_id))
+            names.append(name)
+    return attendant_id, names
+
+
+def legacy_sale(cart, attendant_id):
+    """the sale flow before the checkout engine, one connection per query"""
+    def run(statement, values, fetch=False):
+        conn = DB.connect()
+        try:
+            cur = conn.cursor()
+            cur.execute(statement, values)
+            row = cur.fetchone() if fetch else None
+            conn.commit()
+            return row
+        finally:
+            conn.close()
+
+    for name, quantity in cart:
+        product = run(GET_PRODUCT_BY_NAME, (name,), fetch=True)
+        if product[3] - quantity < 0:
+            return None
+    lines = []
+    for name, quantity in cart:
+        product = run(GET_PRODUCT_BY_NAME, (name,), fetch=True)
+        run(LEGACY_UPDATE_STOCK, (product[3] - quantity, product[0]))
+        lines.append((name, product[2], quantity, product[2] * quantity))
+    sale = run(CREATE_SALE, (sum(line[2] for line in lines),
+                             sum(line[3] for line in lines),
+                             attendant_id), fetch=True)
+    for line in lines:
+        run(CREATE_SALE_ITEM, line + (sale[0],))
+    return sale
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--attendants', type=int, default=8)
+    parser.add_argument('--sales', type=int, default=200,
+                        help='sales made by each attendant')
+    parser.add_argument('--products', type=int, default=5)
+    parser.add_argument('--items', type=int, default=3,
+                        help='products in each sale')
+    parser.add_argument('--batch', type=int, default=0,
+                        help='sales sent in each batch, 0 sends them one by one')
+    parser.add_argument('--legacy', action='store_true')
+    args = parser.parse_args()
+
+    migrate()
+    stock = args.attendants * args.sales * args.items
+    attendant_id, names = seed(args.products, stock)
+    sell = legacy_sale if args.legacy else create_sale
+    sold = Counter()
+    lock = threading.Lock()
+
+    def attendant():
+        mine = Counter()
+        carts = [[(name, 1) for name in
+                  random.sample(names, min(args.items, len(names)))]
+                 for _ in range(args.sales)]
+        if args.batch:
+            for i in range(0, len(carts), args.batch):
+                create_sales(carts[i:i + args.batch], attendant_id)
+        else:
+            for cart in carts:
+                sell(cart, attendant_id)
+        for cart in carts:
+            mine.update(dict(cart))
+        with lock:
+            sold.update(mine)
+
+    threads = [threading.Thread(target=attendant)
+               for _ in range(args.attendants)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    sales = args.attendants * args.sales
+    flow = 'legacy' if args.legacy else 'checkout'
+    if args.batch:
+        flow = 'batch of {}'.format(args.batch)
+    print('{} flow: {} sales by {} attendants in {:.2f}s, {:.1f} sales/s'.format(
+        flow, sales, args.attendants,
+        elapsed, sales / elapsed))
+
+    with DB.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(GET_BENCH_STOCK, (names,))
+        remaining = dict(cur.fetchall())
+    lost = sum(remaining[name] - (stock - sold[name]) for name in names)
+    print('stock updates lost: {}'.format(lost))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+"""
+Load test of the API's hot endpoints.
+
+Seeds a dataset of load-* categories, products, attendants and sales,
+topping up what a previous run left, then drives concurrent clients
+against a running server for each scenario in turn: login, the product
+list, a single product and creating a sale. The requests per second and
+the p50, p95 and p99 latencies of each scenario are printed and saved as
+JSON, named after the current commit by default, and --compare prints
+the change from an earlier result. Start the server against a scratch
+database, e.g. with gunicorn -c gunicorn.conf.py -w 4 run:app, and run
+this with the same DATABASE_* environment variables:
+
+    python -m benchmarks.load --url http://127.0.0.1:8000 --clients 16
+
+The clients are threads of this process, give them a separate machine,
+or at least spare cores, when the server is fast enough for them to
+become the bottleneck.
+"""
+import argparse
+import datetime
+import json
+import random
+import subprocess
+import threading
+import time
+
+import requests
+
+from storemanager.api.v2.database.database import DB
+from storemanager.api.v2.database.migrations import migrate
+
+SCENARIOS = ['login', 'products', 'product', 'sale']
+
+LOAD_PASSWORD = 'load-secret'
+
+SEED_CATEGORIES = """
+    INSERT INTO categories(name, description)
+    SELECT 'load-category-' || i, 'load test category'
+    FROM generate_series(1, %s) i
+    ON CONFLICT (name) DO NOTHING"""
+
+# stock is large enough for the sale scenario never to run out
+SEED_PRODUCTS = """
+    INSERT INTO products(name, price, stock, stockmin, description, category)
+    SELECT 'load-product-' || i, 1 + i %% 500, 1000000000, 0,
+    'load test product', c.id
+    FROM generate_series(1, %s) i
+    JOIN categories c ON c.name = 'load-category-' || (1 + i %% %s)
+    ON CONFLICT (name) DO NOTHING"""
+
+SEED_ATTENDANTS = """
+    INSERT INTO users(name, password, role)
+    SELECT 'load-attendant-' || i, %s, 'attendant'
+    FROM generate_series(1, %s) i
+    ON CONFLICT (name) DO NOTHING"""
+
+COUNT_LOAD_SALE_ITEMS = """
+    SELECT COUNT(*)
+    FROM sale_record_items i
+    JOIN sale_records s ON s.id = i.sale_id
+    JOIN users u ON u.id = s.attendant_id
+    WHERE u.name LIKE 'load-attendant-%'"""
+
+GET_MAX_SALE_ID = """
+    SELECT COALESCE(MAX(id), 0)
+    FROM sale_records"""
+
+# sales are spread over the last year, totals are filled in below
+SEED_SALES = """
+    INSERT INTO sale_records(items, total, attendant_id, date_created)
+    SELECT %s, 0, u.id, CURRENT_DATE - i %% 365
+    FROM generate_series(1, %s) i
+    JOIN users u ON u.name = 'load-attendant-' || (1 + i %% %s)"""
+
+SEED_SALE_ITEMS = """
+    INSERT INTO sale_record_items(product_name, price, quantity, total,
+    sale_id, date_created)
+    SELECT p.name, p.price, 1 + n %% 3, p.price * (1 + n %% 3), s.id,
+    s.date_created
+    FROM sale_records s
+    CROSS JOIN generate_series(1, s.items) n
+    JOIN products p ON p.name = 'load-product-' || (1 + (s.id * 7 + n) %% %s)
+    WHERE s.id > %s"""
+
+SEED_SALE_TOTALS = """
+    UPDATE sale_records s
+    SET total = t.total
+    FROM (SELECT sale_id, SUM(total) AS total
+          FROM sale_record_items
+          WHERE sale_id > %s
+          GROUP BY sale_id) t
+    WHERE s.id = t.sale_id"""
+
+SEED_SALES_ROLLUP = """
+    INSERT INTO sales_daily_rollup(day, attendant_id, product_name,
+    quantity, revenue)
+    SELECT s.date_created, s.attendant_id, i.product_name,
+    SUM(i.quantity), SUM(i.total)
+    FROM sale_records s
+    JOIN sale_record_items i ON i.sale_id = s.id
+    WHERE s.id > %s
+    GROUP BY 1, 2, 3
+    ON CONFLICT (day, attendant_id, product_name) DO UPDATE
+    SET quantity = sales_daily_rollup.quantity + EXCLUDED.quantity,
+    revenue = sales_daily_rollup.revenue + EXCLUDED.revenue"""
+
+GET_LOAD_PRODUCTS = """
+    SELECT id, name
+    FROM products
+    WHERE name LIKE 'load-product-%'"""
+
+
+def seed(categories, products, attendants, sale_items, items_per_sale=3,
+         chunk=50000):
+    """
+    top the load-* rows up to the given counts, the sales are added
+    chunk sales per transaction
+    """
+    with DB.connection(request_scoped=False) as conn:
+        cur = conn.cursor()
+        cur.execute(SEED_CATEGORIES, (categories,))
+        cur.execute(SEED_PRODUCTS, (products, categories))
+        cur.execute(SEED_ATTENDANTS, (LOAD_PASSWORD, attendants))
+        cur.execute(COUNT_LOAD_SALE_ITEMS)
+        missing = sale_items - cur.fetchone()[0]
+        cur.close()
+
+    while missing > 0:
+        sales = min(chunk, -(-missing // items_per_sale))
+        with DB.connection(request_scoped=False) as conn:
+            cur = conn.cursor()
+            cur.execute(GET_MAX_SALE_ID)
+            after_id = cur.fetchone()[0]
+            cur.execute(SEED_SALES, (items_per_sale, sales, attendants))
+            cur.execute(SEED_SALE_ITEMS, (products, after_id))
+            cur.execute(SEED_SALE_TOTALS, (after_id,))
+            cur.execute(SEED_SALES_ROLLUP, (after_id,))
+            cur.close()
+        missing -= sales * items_per_sale
+        print('seeded {} sales, {} sale items to go'.format(
+            sales, max(missing, 0)))
+
+    with DB.connection(request_scoped=False) as conn:
+        cur = conn.cursor()
+        cur.execute(GET_LOAD_PRODUCTS)
+        rows = cur.fetchall()
+        cur.close()
+    return rows
+
+
+def percentile(latencies, share):
+    """nearest rank percentile of sorted latencies"""
+    if not latencies:
+        return None
+    rank = max(int(round(share * len(latencies))) - 1, 0)
+    return latencies[rank]
+
+
+class Client:
+    """One simulated attendant, with its own HTTP session"""
+
+    def __init__(self, url, username, products):
+        self.url = url
+        self.username = username
+        self.products = products
+        self.session = requests.Session()
+        self.token = None
+
+    def login(self):
+        response = self.session.post(
+            self.url + '/auth/login',
+            json={'username': self.username, 'password': LOAD_PASSWORD})
+        if response.status_code == 200:
+            self.token = response.json()['access_token']
+        return response
+
+    def get(self, path):
+        return self.session.get(
+            self.url + path,
+            headers={'Authorization': 'Bearer {}'.format(self.token)})
+
+    def run(self, scenario):
+        """send one request of scenario"""
+        if scenario == 'login':
+            return self.login()
+        if scenario == 'products':
+            return self.get('/api/v2/products')
+        if scenario == 'product':
+            product_id, _ = random.choice(self.products)
+            return self.get('/api/v2/products/{}'.format(product_id))
+        cart = random.sample(self.products, random.randint(1, 3))
+        return self.session.post(
+            self.url + '/api/v2/sales',
+            json={'products': [{'name': name, 'count': 1}
+                               for _, name in cart]},
+            headers={'Authorization': 'Bearer {}'.format(self.token)})
+
+
+def run_scenario(clients, scenario, duration, warmup):
+    """
+    every client sends requests of scenario back to back for warmup and
+    then duration seconds, returns the stats of the latter
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    started = time.perf_counter()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def drive(client):
+        mine = []
+        failed = 0
+        while True:
+            sent = time.perf_counter()
+            if sent >= stop_at:
+                break
+            try:
+                ok = client.run(scenario).status_code < 400
+            except requests.RequestException:
+                ok = False
+            if sent >= measure_from:
+                mine.append(time.perf_counter() - sent)
+                failed += not ok
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=drive, args=(client,))
+               for client in clients]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    stats = {'requests': len(latencies), 'errors': errors[0],
+             'rps': len(latencies) / duration}
+    for label, share in (('p50_ms', 0.5), ('p95_ms', 0.95),
+                         ('p99_ms', 0.99)):
+        value = percentile(latencies, share)
+        stats[label] = None if value is None else value * 1e3
+    return stats
+
+
+def current_commit():
+    """hash of the checked out commit, None outside a git checkout"""
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                         stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode().strip()
+
+
+def print_results(results, previous=None):
+    print('{:<10}{:>10}{:>8}{:>10}{:>10}{:>10}{:>10}'.format(
+        'scenario', 'rps', 'errors', 'p50', 'p95', 'p99', 'rps diff'))
+    for scenario, stats in results['scenarios'].items():
+        change = '-'
+        before = (previous or {}).get('scenarios', {}).get(scenario)
+        if before and before['rps']:
+            change = '{:+.1f}%'.format(
+                (stats['rps'] / before['rps'] - 1) * 100)
+        print('{:<10}{:>10.1f}{:>8}{:>8.1f}ms{:>8.1f}ms{:>8.1f}ms{:>10}'.format(
+            scenario, stats['rps'], stats['errors'], stats['p50_ms'] or 0,
+            stats['p95_ms'] or 0, stats['p99_ms'] or 0, change))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10,
+                        help='seconds each scenario is measured for')
+    parser.add_argument('--warmup', type=float, default=2,
+                        help='seconds each scenario runs before measuring')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS,
+                        default=SCENARIOS)
+    parser.add_argument('--categories', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--attendants', type=int, default=50)
+    parser.add_argument('--sale-items', type=int, default=2000000)
+    parser.add_argument('--output',
+                        help='file the results are saved to, defaults to '
+                             'load-<commit>.json')
+    parser.add_argument('--compare', help='results of an earlier run')
+    args = parser.parse_args()
+
+    migrate()
+    products = seed(args.categories, args.products, args.attendants,
+                    args.sale_items)
+    clients = [Client(args.url.rstrip('/'),
+                      'load-attendant-{}'.format(1 + i % args.attendants),
+                      products)
+               for i in range(args.clients)]
+    for client in clients:
+        client.login().raise_for_status()
+
+    commit = current_commit()
+    results = {
+        'commit': commit,
+        'date': datetime.datetime.utcnow().isoformat(),
+        'url': args.url,
+        'clients': args.clients,
+        'duration': args.duration,
+        'dataset': {'categories': args.categories,
+                    'products': args.products,
+                    'attendants': args.attendants,
+                    'sale_items': args.sale_items},
+        'scenarios': {},
+    }
+    for scenario in args.scenarios:
+        results['scenarios'][scenario] = run_scenario(
+            clients, scenario, args.duration, args.warmup)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+    print_results(results, previous)
+
+    output = args.output or 'load-{}.json'.format((commit or 'unknown')[:8])
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print('results saved to {}'.format(output))
+
+
+if __name__ == '__main__':
+    main()
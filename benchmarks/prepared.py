@@ -0,0 +1,65 @@
+"""
+Benchmark for the prepared statement registry.
+
+Runs each registered hot query the given number of times on one
+connection, first sending the full statement so it is parsed and planned
+on every run, then through its prepared plan so only EXECUTE is sent,
+and reports the mean latency of both. Run it against a scratch database
+configured through the usual DATABASE_* environment variables:
+
+    python -m benchmarks.prepared --runs 5000
+"""
+import argparse
+import time
+
+from storemanager.api.v2.database.database import DB
+from storemanager.api.v2.database.migrations import migrate
+from storemanager.api.v2.database.prepared import PREPARED
+from storemanager.api.v2.database.queries import *
+
+HOT_QUERIES = [
+    ('GET_USER_BY_NAME', GET_USER_BY_NAME, ('bench-user',)),
+    ('CHECK_TOKEN_VALIDITY', CHECK_TOKEN_VALIDITY, ('bench-token',)),
+    ('GET_PRODUCT', GET_PRODUCT, (1,)),
+    ('GET_PRODUCT_BY_NAME', GET_PRODUCT_BY_NAME, ('bench-product',)),
+    ('GET_PRODUCT_WITH_CATEGORY', GET_PRODUCT_WITH_CATEGORY, (1,)),
+]
+
+
+def mean_latency(run, runs):
+    """mean seconds taken by run() over runs calls, after a warm up"""
+    for _ in range(min(runs, 100)):
+        run()
+    started = time.perf_counter()
+    for _ in range(runs):
+        run()
+    return (time.perf_counter() - started) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=5000)
+    args = parser.parse_args()
+
+    migrate()
+    print('{:<28}{:>14}{:>14}{:>10}'.format(
+        'query', 'plan+execute', 'execute', 'speedup'))
+    with DB.connection() as conn:
+        cur = conn.cursor()
+        for label, statement, values in HOT_QUERIES:
+            def planned():
+                cur.execute(statement, values)
+                cur.fetchall()
+
+            def prepared():
+                PREPARED.execute(cur, statement, values)
+                cur.fetchall()
+
+            plain = mean_latency(planned, args.runs)
+            fast = mean_latency(prepared, args.runs)
+            print('{:<28}{:>12.1f}us{:>12.1f}us{:>9.2f}x'.format(
+                label, plain * 1e6, fast * 1e6, plain / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark for worker startup.
+
+Times importing the app and create_app("production") in fresh
+interpreters, as a gunicorn worker boots, with the API docs disabled
+and enabled, and how long the first request for the spec takes when
+they are enabled. Run it against a migrated database configured through
+the usual DATABASE_* environment variables:
+
+    python -m benchmarks.startup --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BOOT = """
+import json, time
+started = time.perf_counter()
+from storemanager import create_app
+imported = time.perf_counter()
+app = create_app("production")
+created = time.perf_counter()
+spec = None
+if app.config['SWAGGER_ENABLED']:
+    app.test_client().get('/apispec_1.json')
+    spec = time.perf_counter() - created
+print(json.dumps({'import': imported - started,
+                  'create_app': created - imported,
+                  'first_spec': spec}))
+"""
+
+
+def boot(swagger):
+    """timings of one boot in a fresh interpreter"""
+    env = dict(os.environ, SWAGGER_ENABLED='1' if swagger else '0')
+    output = subprocess.check_output([sys.executable, '-c', BOOT], env=env,
+                                     stderr=subprocess.DEVNULL)
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    print('{:<10}{:>12}{:>14}{:>14}'.format(
+        'docs', 'import', 'create_app', 'first spec'))
+    for swagger in (False, True):
+        runs = [boot(swagger) for _ in range(args.runs)]
+        medians = {key: statistics.median(run[key] for run in runs)
+                   for key in ('import', 'create_app')}
+        spec = '-'
+        if swagger:
+            spec = '{:.1f}ms'.format(
+                statistics.median(run['first_spec'] for run in runs) * 1e3)
+        print('{:<10}{:>10.1f}ms{:>12.1f}ms{:>14}'.format(
+            'enabled' if swagger else 'disabled', medians['import'] * 1e3,
+            medians['create_app'] * 1e3, spec))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""
+gunicorn settings, used by the Procfile's web process.
+
+The workers write their metrics to prometheus_multiproc_dir so that
+/metrics reports those of every worker. The directory is emptied when
+gunicorn starts and the files of a worker are marked dead when it exits.
+"""
+import os
+import shutil
+import tempfile
+
+# prometheus_client decides where metrics are kept when it is imported,
+# the workers inherit it from here so the directory has to be set first
+os.environ.setdefault('prometheus_multiproc_dir',
+                      os.path.join(tempfile.gettempdir(), 'storemanager-metrics'))
+
+from prometheus_client import multiprocess  # noqa: E402
+
+
+def on_starting(server):
+    metrics_dir = os.environ['prometheus_multiproc_dir']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    multiprocess.mark_process_dead(worker.pid)
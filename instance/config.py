@@ -9,6 +9,29 @@ class Config:
     CSRF_ENABLED = True
     SECRET_KEY = os.environ.get('API_SECRET_KEY')
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
+    PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 500
+    EXPORT_ITERSIZE = 2000
+    REVOKED_TOKENS_MAX = 100000
+    REVOKED_TOKENS_REFRESH = 5
+    USER_CLAIMS_TTL = 30
+    CATEGORY_CACHE_CHECK = 2
+    MODEL_CACHE_ENABLED = True
+    IMPORT_MAX_ROWS = 100000
+    SALES_BATCH_MAX = 1000
+    # apply pending migrations in create_app instead of `flask migrate`
+    AUTO_MIGRATE = os.environ.get('AUTO_MIGRATE') == '1'
+    # serve the API docs under /apidocs, the spec is built on first use
+    SWAGGER_ENABLED = os.environ.get('SWAGGER_ENABLED', '1') == '1'
+    # log statements slower than this, in milliseconds
+    SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', 200))
+    # report each request's query count and time in Server-Timing and
+    # X-DB-Queries response headers
+    SQL_TIMING_HEADERS = True
+    # export request, pool and cache metrics at /metrics
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    # seconds between updates of a worker's pool and cache gauges
+    METRICS_GAUGE_INTERVAL = 5
 
 
 class Development(Config):
@@ -20,6 +43,7 @@ class Testing(Config):
     """Testing Configuration"""
     DEBUG = True
     TESTING = True
+    AUTO_MIGRATE = True
     DATABASE_HOST = os.environ.get('DATABASE_HOST')
     DATABASE_NAME = os.environ.get('DATABASE_NAME')
     DATABASE_USER = os.environ.get('DATABASE_USER')
@@ -34,6 +58,11 @@ class StagingConfig(Config):
 class Production(Config):
     """Production Configuration"""
     DEBUG = False
+    SWAGGER_ENABLED = os.environ.get('SWAGGER_ENABLED') == '1'
+    SQL_TIMING_HEADERS = False
+    # /metrics is not authenticated, only export it where the scraper
+    # alone can reach the workers
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED') == '1'
 
 
 APP_CONFIG = {
@@ -1,6 +1,7 @@
 """
 Module containing function create_app() which when called creates a new app
 """
+import click
 from flask import Flask
 from flasgger import Swagger
 from flask_jwt_extended import JWTManager
@@ -8,9 +9,25 @@ from flask_cors import CORS
 from instance.config import APP_CONFIG
 
 from storemanager.api.v2.database.database import DB
+from storemanager.api.v2.database.instrumentation import QUERY_STATS
+from storemanager.api.v2.database.migrations import (
+    LATEST_VERSION, current_version, migrate)
 from storemanager.api.v2.utils.custom_checks import is_token_revoked
+from storemanager.api.v2.utils.metrics import METRICS
+from storemanager.api.v2.utils.revoked_tokens import REVOKED_TOKENS
+from storemanager.api.v2.models.category import CATEGORY_CACHE
+from storemanager.api.v2.models.cache import MODEL_CACHES
 from storemanager.api.v2 import api_blueprint, auth_blueprint
 
+SWAGGER_TEMPLATE = {
+    "swagger": "3.0",
+    "info": {
+        "title": "Store Manager API",
+        "description": "API for the store manager application, with PostgreSQL database",
+        "version": "2.0.0"
+    }
+}
+
 
 def create_app(config_name):
     """Create app and register api"""
@@ -24,20 +41,47 @@ def create_app(config_name):
     app.register_blueprint(api_blueprint)
     app.register_blueprint(auth_blueprint)
 
-    DB.create_all_tables()
+    version = current_version()
+    if version < LATEST_VERSION and app.config['AUTO_MIGRATE']:
+        migrate()
+        version = LATEST_VERSION
+    REVOKED_TOKENS.configure(app.config['REVOKED_TOKENS_MAX'],
+                             app.config['REVOKED_TOKENS_REFRESH'])
+    if version < LATEST_VERSION:
+        app.logger.warning(
+            'database schema is at version %s of %s, run flask migrate',
+            version, LATEST_VERSION)
+    else:
+        REVOKED_TOKENS.refresh()
+    CATEGORY_CACHE.configure(app.config['CATEGORY_CACHE_CHECK'])
+    MODEL_CACHES.configure(app.config['MODEL_CACHE_ENABLED'])
+    QUERY_STATS.configure(app.config['SLOW_QUERY_MS'])
+    if app.config['METRICS_ENABLED']:
+        METRICS.init_app(app)
+    if app.config['SQL_TIMING_HEADERS']:
+        # registered before commit_request so that it runs after it and
+        # the headers include the time of the commit
+        app.after_request(QUERY_STATS.timing_headers)
+    app.after_request(DB.commit_request)
+    app.teardown_request(DB.end_request)
     jwt = JWTManager(app)
     CORS(app)
 
-    template = {
-        "swagger": "3.0",
-        "info": {
-            "title": "Store Manager API",
-            "description": "API for the store manager application, with PostgreSQL database",
-            "version": "2.0.0"
-        }
-    }
+    if app.config['SWAGGER_ENABLED']:
+        # flasgger only reads the docs/*.yml files of the views when the
+        # spec is first requested and keeps the result for later requests
+        Swagger(app, template=SWAGGER_TEMPLATE)
 
-    Swagger(app, template=template)
+    @app.cli.command('migrate')
+    @click.option('--to', 'target', type=int,
+                  help='version to migrate to, defaults to the latest')
+    def migrate_command(target):
+        """Apply the pending database migrations"""
+        applied = migrate(target)
+        for number, description in applied:
+            click.echo('applied migration {}: {}'.format(number, description))
+        click.echo('database schema is at version {}'.format(
+            current_version()))
 
     @jwt.token_in_blacklist_loader
     def check_if_token_in_blacklist(decrypted_token):
@@ -1,8 +1,9 @@
 from flask import Blueprint
 from flask_restful import Api
 from storemanager.api.v2.views.category_views import Category, Categories
-from storemanager.api.v2.views.product_views import Product, ProductList
-from storemanager.api.v2.views.sale_views import SaleRecord, SaleRecords
+from storemanager.api.v2.views.product_views import Product, ProductList, ProductImport
+from storemanager.api.v2.views.report_views import SalesReport
+from storemanager.api.v2.views.sale_views import SaleRecord, SaleRecords, SaleRecordsBatch, SaleRecordsExport, SaleRecordsMine
 from storemanager.api.v2.views.user_views import *
 
 api_blueprint = Blueprint("api", __name__, url_prefix="/api/v2")
@@ -12,14 +13,20 @@ api = Api(api_blueprint)
 auth_api = Api(auth_blueprint)
 
 api.add_resource(ProductList, '/products')
+api.add_resource(ProductImport, '/products/import')
 api.add_resource(Product, '/products/<product_id>')
 
 api.add_resource(SaleRecords, '/sales')
+api.add_resource(SaleRecordsBatch, '/sales/batch')
+api.add_resource(SaleRecordsExport, '/sales/export')
+api.add_resource(SaleRecordsMine, '/sales/mine')
 api.add_resource(SaleRecord, '/sales/<sale_id>')
 
 api.add_resource(UserList, '/users')
 api.add_resource(User, '/users/<user_id>')
 
+api.add_resource(SalesReport, '/reports/sales')
+
 api.add_resource(Category, '/categories/<category_id>')
 api.add_resource(Categories, '/categories')
 
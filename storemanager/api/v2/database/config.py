@@ -15,3 +15,16 @@ def config():
     }
 
     return database
+
+
+def pool_config():
+    """Connection pool settings, see ConnectionPool for their meaning"""
+    pool = {
+        'min_size': int(os.environ.get('DATABASE_POOL_MIN', 1)),
+        'max_size': int(os.environ.get('DATABASE_POOL_MAX', 10)),
+        'max_uses': int(os.environ.get('DATABASE_POOL_RECYCLE', 500)),
+        'timeout': float(os.environ.get('DATABASE_POOL_TIMEOUT', 30)),
+        'ping_after': float(os.environ.get('DATABASE_POOL_PING_AFTER', 30))
+    }
+
+    return pool
@@ -1,35 +1,141 @@
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
-from storemanager.api.v2.database.config import config
+from psycopg2.extras import execute_values
+from flask import g, has_request_context
+from storemanager.api.v2.database.config import config, pool_config
+from storemanager.api.v2.database.instrumentation import (
+    QUERY_STATS, InstrumentedCursor)
+from storemanager.api.v2.database.pool import ConnectionPool
+from storemanager.api.v2.database.prepared import (
+    PREPARED, PreparingConnection)
 from .queries import *
 
-conn = None
-result = None
-
 
 class Database:
 
+    def __init__(self):
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
     def connect(self):
         params = config()
-        conn = psycopg2.connect(**params)
+        conn = psycopg2.connect(connection_factory=PreparingConnection,
+                                cursor_factory=InstrumentedCursor, **params)
         #conn = psycopg2.connect(os.environ['DATABASE_URL'], sslmode='require')
 
         return conn
 
-    @classmethod
-    def create_all_tables(cls):
-        print('Creating Tables')
-        create_tables_query = [
-            CREATE_TABLE_USERS,
-            CREATE_TABLE_CATEGORIES,
-            CREATE_TABLE_PRODUCTS,
-            CREATE_TABLE_SALES,
-            CREATE_TABLE_SALE_ITEMS,
-            CREATE_TOKENS_TABLE
-        ]
-
-        for statement in create_tables_query:
-            execute_query([statement], "one_no_result")
+    @property
+    def pool(self):
+        """process wide connection pool, created on first use"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    pool = ConnectionPool(self.connect, **pool_config())
+                    pool.fill()
+                    self._pool = pool
+        return self._pool
+
+    @contextmanager
+    def connection(self, request_scoped=True):
+        """
+        Borrow a connection from the pool. Within a request every call shares
+        one connection and transaction which is finished by commit_request and
+        end_request, unless request_scoped is False. Otherwise the transaction
+        is committed when the block exits and rolled back if it raises,
+        within a request an exception leaving the block makes the request
+        roll back.
+        """
+        if request_scoped and has_request_context():
+            if 'db_conn' not in g:
+                started = time.perf_counter()
+                g.db_conn = self.pool.getconn()
+                QUERY_STATS.record_acquire(time.perf_counter() - started)
+            try:
+                yield g.db_conn
+            except Exception as error:
+                # make sure none of the request's writes get committed, a
+                # failed statement also aborted the transaction so roll it
+                # back now to keep the connection usable for the request
+                if isinstance(error, psycopg2.Error) and not g.db_conn.closed:
+                    g.db_conn.rollback()
+                g.db_rollback = True
+                raise
+            return
+
+        conn = self.pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def stream(self, statement, values=None, itersize=2000):
+        """
+        Yield the rows of statement through a server side cursor, so only
+        itersize rows are held in memory at a time. Uses a connection of
+        its own as the rows are usually consumed after the request ended.
+        """
+        conn = self.pool.getconn()
+        try:
+            cur = conn.cursor(name='stream')
+            cur.itersize = itersize
+            cur.execute(statement, values)
+            for row in cur:
+                yield row
+            cur.close()
+        finally:
+            self.pool.putconn(conn)
+
+    def after_commit(self, callback):
+        """
+        Call callback once the request's transaction has been committed,
+        it is dropped if the transaction is rolled back. Outside of a
+        request it is called straight away.
+        """
+        if has_request_context() and 'db_conn' in g:
+            g.setdefault('db_after_commit', []).append(callback)
+        else:
+            callback()
+
+    def commit_request(self, response):
+        """
+        Commit the request's transaction before the response is sent,
+        server errors roll it back instead
+        """
+        conn = g.get('db_conn')
+        if conn is not None:
+            if response.status_code >= 500 or g.get('db_rollback'):
+                conn.rollback()
+            else:
+                started = time.perf_counter()
+                conn.commit()
+                QUERY_STATS.record_query('COMMIT',
+                                         time.perf_counter() - started)
+                for callback in g.pop('db_after_commit', ()):
+                    callback()
+        return response
+
+    def end_request(self, error=None):
+        """Roll back whatever was not committed and return the connection"""
+        conn = g.pop('db_conn', None)
+        g.pop('db_rollback', None)
+        g.pop('db_after_commit', None)
+        if conn is None:
+            return
+        try:
+            if not conn.closed:
+                conn.rollback()
+        finally:
+            self.pool.putconn(conn)
 
     @classmethod
     def drop_tables(cls):
@@ -37,43 +143,70 @@ class Database:
         execute_query([DROP_ALL_TABLES], "one_no_result")
 
 
-def execute_query(query, flag):
-    """Execute queries based on flag values"""
-    try:
-        global conn, result
-        statement = query[0]
-        conn = DB.connect()
-        cur = conn.cursor()
+def execute_values_returning(cur, statement, rows, page_size=1000):
+    """
+    execute_values sending page_size rows per statement, returns the rows
+    returned by every page as psycopg2 only keeps those of the last one
+    """
+    returned = []
+    for start in range(0, len(rows), page_size):
+        page = rows[start:start + page_size]
+        execute_values(cur, statement, page, page_size=len(page))
+        if cur.description is not None:
+            returned.extend(cur.fetchall())
+    return returned
 
-        if flag is "one":
-            values = query[1]
-            cur.execute(statement, values)
-            result = cur.fetchone()
 
-        elif flag is "one_no_result":
-            cur.execute(statement)
-        elif flag is "many":
-            values = query[1]
-            cur.execute(statement, values)
-            result = cur.fetchall()
-
-        elif flag is "many_no_values":
-            cur.execute(statement)
-            result = cur.fetchall()
-
-        elif flag is "one_row_count":
-            value = query[1]
-            cur.execute(statement, value)
-            result = cur.rowcount
-        conn.commit()
-        cur.close()
-    except (Exception, psycopg2.DatabaseError) as error:
-        print(error)
-    finally:
-        if conn is not None:
-            conn.close()
+def _fetch_one(cur):
+    return cur.fetchone()
 
-    return result
+
+def _fetch_all(cur):
+    return cur.fetchall()
+
+
+def _fetch_nothing(cur):
+    return None
+
+
+def _row_count(cur):
+    return cur.rowcount
+
+
+# what execute_query returns for each flag
+FETCHERS = {
+    'one': _fetch_one,
+    'one_no_result': _fetch_nothing,
+    'many': _fetch_all,
+    'many_no_values': _fetch_all,
+    'one_row_count': _row_count,
+}
+
+
+def execute_query(query, flag):
+    """
+    Execute query, a [statement] or [statement, values] list, and return
+    the result flag asks for:
+        one             the first row as a tuple, None if there is none
+        one_no_result   None
+        many            a list of rows, possibly empty
+        many_no_values  a list of rows, for statements without values
+        one_row_count   the number of rows affected as an int
+    Nothing is shared between calls, so it is safe to use from any thread.
+    Database errors are raised, ValueError for an unknown flag.
+    """
+    fetch = FETCHERS.get(flag)
+    if fetch is None:
+        raise ValueError('unknown query flag {!r}'.format(flag))
+    statement = query[0]
+    values = query[1] if len(query) > 1 else None
+    with DB.connection() as conn:
+        cur = conn.cursor()
+        try:
+            PREPARED.execute(cur, statement, values)
+            return fetch(cur)
+        finally:
+            cur.close()
 
 
 DB = Database()
@@ -0,0 +1,119 @@
+"""
+This module contains the SQL instrumentation. Every pooled connection
+hands out InstrumentedCursor, which times each statement it sends. Within
+a request the number of statements, their total time and the time spent
+waiting for a pooled connection are added up on flask.g, and statements
+slower than the configured threshold are logged under their queries.py
+name.
+"""
+import logging
+import re
+import time
+
+from flask import g, has_request_context
+from psycopg2.extensions import cursor
+
+from . import queries
+
+LOGGER = logging.getLogger(__name__)
+
+WHITESPACE = re.compile(r'\s+')
+
+# queries.py constant name of each statement, keyed by the statement text
+STATEMENT_NAMES = {
+    statement: name for name, statement in vars(queries).items()
+    if name.isupper() and isinstance(statement, str)
+}
+
+# execute_values sends its statement with the rows spliced into the
+# VALUES %s of the template, so those are named by the text around it
+VALUES_TEMPLATES = sorted(
+    ((pre.replace('%%', '%').encode(), post.replace('%%', '%').encode(), name)
+     for statement, name in STATEMENT_NAMES.items()
+     if statement.count('%s') == 1 and 'VALUES %s' in statement
+     for pre, post in [statement.split('%s')]),
+    key=lambda template: -len(template[0]))
+
+
+def name_statement(statement, name):
+    """log statement under name, for statements built from a constant"""
+    STATEMENT_NAMES[statement] = name
+
+
+def statement_name(statement):
+    """queries.py name of statement, or its start for unnamed ones"""
+    name = STATEMENT_NAMES.get(statement)
+    if name is not None:
+        return name
+    if isinstance(statement, bytes):
+        for pre, post, name in VALUES_TEMPLATES:
+            if statement.startswith(pre) and statement.endswith(post):
+                return name
+        statement = statement.decode(errors='replace')
+    return WHITESPACE.sub(' ', str(statement)).strip()[:80]
+
+
+class QueryStats:
+    """Query counters of the current request and the slow query log"""
+
+    def __init__(self):
+        self.slow_query_ms = None
+
+    def configure(self, slow_query_ms):
+        """log statements taking longer than slow_query_ms, None for never"""
+        self.slow_query_ms = slow_query_ms
+
+    def record_query(self, statement, seconds):
+        if has_request_context():
+            g.db_queries = g.get('db_queries', 0) + 1
+            g.db_time = g.get('db_time', 0.0) + seconds
+        if (self.slow_query_ms is not None
+                and seconds * 1e3 >= self.slow_query_ms):
+            LOGGER.warning('slow query %s took %.1fms',
+                           statement_name(statement), seconds * 1e3)
+
+    def record_acquire(self, seconds):
+        if has_request_context():
+            g.db_acquire = g.get('db_acquire', 0.0) + seconds
+
+    def request_stats(self):
+        """(queries, query seconds, acquire seconds) of the current request"""
+        return (g.get('db_queries', 0), g.get('db_time', 0.0),
+                g.get('db_acquire', 0.0))
+
+    def timing_headers(self, response):
+        """after_request hook adding the request's stats to the response"""
+        count, query_time, acquire_time = self.request_stats()
+        response.headers['Server-Timing'] = (
+            'db;dur={:.2f};desc="{} queries", db-acquire;dur={:.2f}'.format(
+                query_time * 1e3, count, acquire_time * 1e3))
+        response.headers['X-DB-Queries'] = str(count)
+        return response
+
+
+QUERY_STATS = QueryStats()
+
+
+class InstrumentedCursor(cursor):
+    """psycopg2 cursor reporting the time of its statements to QUERY_STATS"""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            QUERY_STATS.record_query(query, time.perf_counter() - started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            QUERY_STATS.record_query(query, time.perf_counter() - started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            QUERY_STATS.record_query(sql, time.perf_counter() - started)
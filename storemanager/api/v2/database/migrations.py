@@ -0,0 +1,97 @@
+"""
+This module contains the migration runner. The schema is built by the
+numbered migrations in MIGRATIONS, each applied once and recorded in the
+schema_version table. They are applied with `flask migrate`, create_app
+only checks that the database is up to date.
+
+Every statement of the migrations below is idempotent, so databases
+created before schema_version existed are brought under it safely.
+New migrations are appended with the next number and never changed once
+released.
+"""
+from storemanager.api.v2.database.database import DB
+from storemanager.api.v2.database.queries import *
+
+MIGRATIONS = [
+    (1, 'initial schema', [
+        CREATE_TABLE_USERS,
+        CREATE_TABLE_CATEGORIES,
+        CREATE_TABLE_PRODUCTS,
+        CREATE_TABLE_SALES,
+        CREATE_TABLE_SALE_ITEMS,
+        CREATE_TOKENS_TABLE,
+    ]),
+    (2, 'indexes for lookups by name, token and sale', [
+        CHECK_NAMES_UNIQUE,
+        DEDUPE_TOKENS,
+        CREATE_INDEX_USERS_NAME,
+        CREATE_INDEX_CATEGORIES_NAME,
+        CREATE_INDEX_PRODUCTS_NAME,
+        CREATE_INDEX_SALE_ITEMS_SALE,
+        CREATE_INDEX_TOKENS_TOKEN,
+    ]),
+    (3, 'table versions for caches and etags', [
+        CREATE_TABLE_VERSIONS,
+        CREATE_PRODUCTS_VERSION,
+    ]),
+    (4, 'daily sales rollup', [
+        CREATE_TABLE_SALES_ROLLUP,
+        BACKFILL_SALES_ROLLUP,
+    ]),
+    (5, 'index sales by attendant and id', [
+        CREATE_INDEX_SALES_ATTENDANT,
+        DROP_INDEX_SALES_ATTENDANT_ID,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# key of the advisory lock held while migrating, so that of many
+# processes migrating at once only one applies the migrations
+MIGRATION_LOCK_KEY = 710417
+
+
+def read_version(cur):
+    """version recorded in schema_version, 0 if it does not exist yet"""
+    cur.execute(SCHEMA_VERSION_EXISTS)
+    if cur.fetchone()[0] is None:
+        return 0
+    cur.execute(GET_SCHEMA_VERSION)
+    return cur.fetchone()[0]
+
+
+def current_version():
+    """version of the database's schema, one cheap query"""
+    with DB.connection(request_scoped=False) as conn:
+        cur = conn.cursor()
+        version = read_version(cur)
+        cur.close()
+    return version
+
+
+def migrate(target=None):
+    """
+    Apply the migrations above the database's version, up to target or
+    the latest. All of them run in one transaction holding the migration
+    lock. Returns the (number, description) of those applied.
+    """
+    target = LATEST_VERSION if target is None else target
+    if current_version() >= target:
+        return []
+
+    applied = []
+    with DB.connection(request_scoped=False) as conn:
+        cur = conn.cursor()
+        cur.execute(LOCK_MIGRATIONS, (MIGRATION_LOCK_KEY,))
+        cur.execute(CREATE_TABLE_SCHEMA_VERSION)
+        # another process may have migrated while we waited for the lock
+        version = read_version(cur)
+        for number, description, statements in MIGRATIONS:
+            if number <= version or number > target:
+                continue
+            for statement in statements:
+                cur.execute(statement)
+            cur.execute(RECORD_SCHEMA_VERSION, (number, description))
+            applied.append((number, description))
+        cur.close()
+    return applied
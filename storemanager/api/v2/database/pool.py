@@ -0,0 +1,165 @@
+"""
+This module contains the ConnectionPool class.
+The pool hands out reusable psycopg2 connections so that queries do not
+pay for a new TCP connection and authentication handshake every time.
+"""
+import os
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+
+class ConnectionPool:
+    """Thread-safe pool of psycopg2 connections, safe to use across forks"""
+
+    def __init__(self, connect, min_size=1, max_size=10, max_uses=500,
+                 timeout=30, ping_after=30):
+        """
+        connect is a callable returning a new connection, min_size connections
+        are opened up front, at most max_size are open at any time. A connection
+        is closed after max_uses checkouts, a checkout waits at most timeout
+        seconds and connections idle for ping_after seconds are checked first.
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError('pool size should satisfy 0 <= min <= max, max >= 1')
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._orphans = []
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Condition()
+        self._idle = []
+        self._uses = {}
+        self._size = 0
+
+    def _check_fork(self):
+        """
+        Forget connections inherited from a parent process, closing them
+        here would terminate the sessions the parent is still using.
+        """
+        if self._pid != os.getpid():
+            self._orphans.extend(conn for conn, _ in self._idle)
+            self._reset()
+
+    def fill(self):
+        """open connections until min_size connections are idle"""
+        self._check_fork()
+        while True:
+            with self._lock:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            conn = self._open()
+            self.putconn(conn)
+
+    def getconn(self):
+        """check out a healthy connection, waiting if the pool is exhausted"""
+        self._check_fork()
+        deadline = time.monotonic() + self.timeout
+        while True:
+            conn, idle_since = self._checkout(deadline)
+            if conn is None:
+                conn = self._open()
+            elif not self._is_healthy(conn, idle_since):
+                self._discard(conn)
+                continue
+            with self._lock:
+                self._uses[id(conn)] = self._uses.get(id(conn), 0) + 1
+            return conn
+
+    def putconn(self, conn):
+        """return a connection, closing it if broken or used max_uses times"""
+        if self._pid != os.getpid():
+            return
+        if not conn.closed and \
+                conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                pass
+
+        status = None if conn.closed else conn.get_transaction_status()
+        if status != extensions.TRANSACTION_STATUS_IDLE or \
+                self._uses.get(id(conn), 0) >= self.max_uses:
+            self._discard(conn)
+            return
+
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+            self._lock.notify()
+
+    def closeall(self):
+        """close every idle connection, used ones are closed when returned"""
+        self._check_fork()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self):
+        """current pool occupancy"""
+        with self._lock:
+            return {'size': self._size,
+                    'idle': len(self._idle),
+                    'in_use': self._size - len(self._idle),
+                    'max_size': self.max_size}
+
+    def _checkout(self, deadline):
+        """
+        Pop an idle connection, or reserve room for a new one in which
+        case None is returned and the caller has to open it.
+        """
+        with self._lock:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolError('timed out waiting for a database connection')
+                self._lock.wait(remaining)
+
+    def _open(self):
+        try:
+            return self._connect()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+
+    def _is_healthy(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if self.ping_after is None or \
+                time.monotonic() - idle_since < self.ping_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT 1')
+            cur.close()
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._lock:
+            self._uses.pop(id(conn), None)
+            self._size -= 1
+            self._lock.notify()
@@ -0,0 +1,73 @@
+"""
+This module contains the registry of server side prepared statements.
+A registered statement is PREPAREd the first time a pooled connection
+runs it, later runs only EXECUTE the prepared plan, which saves parsing
+and planning the statement on every request.
+"""
+import re
+
+from psycopg2.extensions import connection
+
+from .instrumentation import name_statement, statement_name
+from .queries import *
+
+PLACEHOLDER = re.compile(r'%s')
+
+
+class PreparingConnection(connection):
+    """psycopg2 connection remembering the statements it has prepared"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+class PreparedStatements:
+    """
+    Statements to prepare, keyed by their text so that callers keep
+    passing the queries.py constant and are unaware of the preparing
+    """
+
+    def __init__(self):
+        self._statements = {}
+
+    def register(self, name, statement):
+        """
+        Prepare statement under name, its values have to be passed as
+        plain %s placeholders. It should list its columns, a prepared
+        SELECT * fails once a migration changes the table's columns.
+        """
+        count = len(PLACEHOLDER.findall(statement))
+        numbered = iter(range(1, count + 1))
+        prepare = 'PREPARE {} AS {}'.format(
+            name, PLACEHOLDER.sub(lambda _: '${}'.format(next(numbered)),
+                                  statement))
+        execute = 'EXECUTE {}'.format(name)
+        if count:
+            execute += ' ({})'.format(', '.join(['%s'] * count))
+        self._statements[statement] = (name, prepare, execute)
+        name_statement(execute, statement_name(statement))
+
+    def execute(self, cur, statement, values=None):
+        """run statement on cur, through its prepared plan if registered"""
+        entry = self._statements.get(statement)
+        prepared = getattr(cur.connection, 'prepared', None)
+        if entry is None or prepared is None:
+            cur.execute(statement, values)
+            return
+
+        name, prepare, execute = entry
+        if name not in prepared:
+            # prepared statements outlive the transaction, even when it
+            # is rolled back, so each connection only prepares once
+            cur.execute(prepare)
+            prepared.add(name)
+        cur.execute(execute, values)
+
+
+PREPARED = PreparedStatements()
+PREPARED.register('get_user_by_name', GET_USER_BY_NAME)
+PREPARED.register('check_token_validity', CHECK_TOKEN_VALIDITY)
+PREPARED.register('get_product', GET_PRODUCT)
+PREPARED.register('get_product_by_name', GET_PRODUCT_BY_NAME)
+PREPARED.register('get_product_with_category', GET_PRODUCT_WITH_CATEGORY)
@@ -58,9 +58,134 @@ CREATE_TOKENS_TABLE = """
     TOKEN VARCHAR(100) NOT NULL
     );"""
 
+CREATE_TABLE_SCHEMA_VERSION = """
+    CREATE TABLE IF NOT EXISTS SCHEMA_VERSION (
+    VERSION INTEGER PRIMARY KEY,
+    DESCRIPTION TEXT NOT NULL,
+    APPLIED_AT TIMESTAMP NOT NULL DEFAULT now()
+    );"""
+
+SCHEMA_VERSION_EXISTS = """
+    SELECT to_regclass('schema_version')"""
+
+GET_SCHEMA_VERSION = """
+    SELECT COALESCE(MAX(version), 0)
+    FROM schema_version"""
+
+RECORD_SCHEMA_VERSION = """
+    INSERT INTO schema_version(version, description)
+    VALUES(%s, %s)"""
+
+LOCK_MIGRATIONS = """
+    SELECT pg_advisory_xact_lock(%s)"""
+
+CREATE_TABLE_VERSIONS = """
+    CREATE TABLE IF NOT EXISTS TABLE_VERSIONS (
+    NAME VARCHAR(50) PRIMARY KEY,
+    VERSION BIGINT NOT NULL DEFAULT 0
+    );"""
+
+CREATE_TABLE_SALES_ROLLUP = """
+    CREATE TABLE IF NOT EXISTS SALES_DAILY_ROLLUP (
+    DAY DATE NOT NULL,
+    ATTENDANT_ID INTEGER NOT NULL,
+    PRODUCT_NAME TEXT NOT NULL,
+    QUANTITY BIGINT NOT NULL,
+    REVENUE BIGINT NOT NULL,
+    PRIMARY KEY (DAY, ATTENDANT_ID, PRODUCT_NAME)
+    );"""
+
+CREATE_PRODUCTS_VERSION = """
+    CREATE SEQUENCE IF NOT EXISTS PRODUCTS_VERSION
+    MINVALUE 0 START 0;"""
+
+# the unique indexes on names cannot be built over duplicate names, which
+# are reported instead of renamed as users log in with theirs. The
+# migration fails, and changes nothing, until they are resolved by hand
+CHECK_NAMES_UNIQUE = """
+    DO $$
+    DECLARE
+        duplicates TEXT;
+    BEGIN
+        SELECT string_agg(format('%s %L (ids %s)', tbl, name, ids), ', ')
+        INTO duplicates
+        FROM (SELECT 'users' AS tbl, name,
+                     string_agg(id::TEXT, ', ' ORDER BY id) AS ids
+              FROM users GROUP BY name HAVING COUNT(*) > 1
+              UNION ALL
+              SELECT 'categories', name,
+                     string_agg(id::TEXT, ', ' ORDER BY id)
+              FROM categories GROUP BY name HAVING COUNT(*) > 1
+              UNION ALL
+              SELECT 'products', name,
+                     string_agg(id::TEXT, ', ' ORDER BY id)
+              FROM products GROUP BY name HAVING COUNT(*) > 1) d;
+        IF duplicates IS NOT NULL THEN
+            RAISE EXCEPTION 'duplicate names: %', duplicates
+            USING HINT = 'rename or remove the duplicates and migrate again';
+        END IF;
+    END $$;"""
+
+# a token revoked twice only needs one row
+DEDUPE_TOKENS = """
+    DELETE FROM tokens t
+    USING tokens d
+    WHERE d.token = t.token AND d.id < t.id;"""
+
+CREATE_INDEX_USERS_NAME = """
+    CREATE UNIQUE INDEX IF NOT EXISTS USERS_NAME_KEY
+    ON USERS (NAME);"""
+
+CREATE_INDEX_CATEGORIES_NAME = """
+    CREATE UNIQUE INDEX IF NOT EXISTS CATEGORIES_NAME_KEY
+    ON CATEGORIES (NAME);"""
+
+CREATE_INDEX_PRODUCTS_NAME = """
+    CREATE UNIQUE INDEX IF NOT EXISTS PRODUCTS_NAME_KEY
+    ON PRODUCTS (NAME);"""
+
+CREATE_INDEX_SALES_ATTENDANT = """
+    CREATE INDEX IF NOT EXISTS SALE_RECORDS_ATTENDANT_ID_ID_IDX
+    ON SALE_RECORDS (ATTENDANT_ID, ID);"""
+
+# replaced by the (attendant_id, id) index, which serves the same lookups
+DROP_INDEX_SALES_ATTENDANT_ID = """
+    DROP INDEX IF EXISTS SALE_RECORDS_ATTENDANT_ID_IDX;"""
+
+CREATE_INDEX_SALE_ITEMS_SALE = """
+    CREATE INDEX IF NOT EXISTS SALE_RECORD_ITEMS_SALE_ID_IDX
+    ON SALE_RECORD_ITEMS (SALE_ID);"""
+
+CREATE_INDEX_TOKENS_TOKEN = """
+    CREATE UNIQUE INDEX IF NOT EXISTS TOKENS_TOKEN_KEY
+    ON TOKENS (TOKEN);"""
+
 DROP_ALL_TABLES = """
     DROP TABLE IF EXISTS USERS, PRODUCTS, CATEGORIES,
-    SALE_RECORDS, SALE_RECORD_ITEMS, TOKENS;"""
+    SALE_RECORDS, SALE_RECORD_ITEMS, TOKENS, TABLE_VERSIONS,
+    SALES_DAILY_ROLLUP, SCHEMA_VERSION;
+    DROP SEQUENCE IF EXISTS PRODUCTS_VERSION;"""
+
+GET_TABLE_VERSION = """
+    SELECT version
+    FROM table_versions
+    WHERE name = %s"""
+
+BUMP_TABLE_VERSION = """
+    INSERT INTO table_versions(name, version)
+    VALUES(%s, 1)
+    ON CONFLICT (name) DO UPDATE
+    SET version = table_versions.version + 1
+    RETURNING version"""
+
+BUMP_PRODUCTS_VERSION = """
+    SELECT nextval('products_version')"""
+
+# last_value of a sequence is the same before and after its first
+# nextval, is_called tells them apart
+GET_CATALOGUE_VERSIONS = """
+    SELECT (SELECT last_value + is_called::int FROM products_version),
+    (SELECT version FROM table_versions WHERE name = 'categories')"""
 
 CREATE_CATEGORY = """
     INSERT INTO categories(name, description)
@@ -72,11 +197,21 @@ GET_CATEGORY = """
     FROM categories
     WHERE id = %s"""
 
+GET_CATEGORY_IDS_BY_NAME = """
+    SELECT name, id
+    FROM categories
+    WHERE name = ANY(%s)"""
+
 GET_CATEGORY_BY_NAME = """
     SELECT id, name, description
     FROM categories
     WHERE name = %s"""
 
+GET_ALL_CATEGORIES = """
+    SELECT id, name, description, date_created
+    FROM categories
+    ORDER BY id"""
+
 DELETE_CATEGORY = """
     DELETE FROM categories
     WHERE id = %s"""
@@ -86,20 +221,60 @@ UPDATE_CATEGORY = """
     SET name = %s, description = %s
     WHERE id = %s"""
 
-GET_ALL_CATEGORIES = """
+GET_CATEGORIES_PAGE = """
     SELECT id, name, description, date_created
     FROM categories
-    ORDER BY id"""
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s"""
 
 CREATE_PRODUCT = """
+    WITH product AS (
     INSERT INTO products(name, price, stock, stockmin, description, category)
     VALUES(%s, %s, %s,%s, %s, %s)
-    RETURNING id, name, description, price, stock, stockmin, date_created, category;"""
+    RETURNING id, name, price, stock, stockmin, description, date_created, category)
+    SELECT product.id, product.name, product.price, product.stock,
+    product.stockmin, product.description, product.date_created, c.name
+    FROM product
+    LEFT JOIN categories c ON c.id = product.category;"""
+
+CREATE_PRODUCT_STAGING = """
+    CREATE TEMP TABLE PRODUCT_STAGING (
+    LINE INTEGER NOT NULL,
+    NAME VARCHAR(50) NOT NULL,
+    PRICE INTEGER NOT NULL,
+    STOCK INTEGER NOT NULL,
+    STOCKMIN INTEGER NOT NULL,
+    DESCRIPTION TEXT NOT NULL,
+    CATEGORY INTEGER NOT NULL
+    ) ON COMMIT DROP;"""
+
+COPY_PRODUCT_STAGING = """
+    COPY product_staging(line, name, price, stock, stockmin,
+    description, category)
+    FROM STDIN WITH (FORMAT csv)"""
+
+INSERT_STAGED_PRODUCTS = """
+    INSERT INTO products(name, price, stock, stockmin, description, category)
+    SELECT name, price, stock, stockmin, description, category
+    FROM product_staging
+    ORDER BY line
+    ON CONFLICT (name) DO NOTHING
+    RETURNING name"""
 
 GET_PRODUCT = """
-    SELECT * FROM products
+    SELECT id, name, price, stock, stockmin, description, date_created,
+    category
+    FROM products
     WHERE id = %s"""
 
+GET_PRODUCT_WITH_CATEGORY = """
+    SELECT p.id, p.name, p.price, p.stock, p.stockmin,
+    p.description, p.date_created, c.name
+    FROM products p
+    LEFT JOIN categories c ON c.id = p.category
+    WHERE p.id = %s"""
+
 GET_PRODUCT_BY_NAME = """
     SELECT id, name, price, stock, stockmin
     FROM products
@@ -115,19 +290,39 @@ UPDATE_PRODUCT = """
     stock = %s, stockmin = %s, category = %s
     WHERE id = %s;"""
 
-UPDATE_PRODUCT_ON_SALE = """
-    UPDATE products
-    SET stock = %s
-    WHERE id = %s;"""
-
-GET_ALL_PRODUCTS = """
-    SELECT * FROM products ORDER BY id"""
+GET_PRODUCTS_FOR_SALE = """
+    SELECT id, name, price, stock, stockmin
+    FROM products
+    WHERE name = ANY(%s)
+    ORDER BY id
+    FOR UPDATE"""
+
+DECREMENT_PRODUCT_STOCK = """
+    UPDATE products AS p
+    SET stock = p.stock - v.quantity
+    FROM (VALUES %s) AS v(id, quantity)
+    WHERE p.id = v.id AND p.stock - v.quantity >= p.stockmin
+    RETURNING p.id"""
+
+GET_PRODUCTS_PAGE = """
+    SELECT p.id, p.name, p.price, p.stock, p.stockmin,
+    p.description, p.date_created, c.name
+    FROM products p
+    LEFT JOIN categories c ON c.id = p.category
+    WHERE p.id > %s
+    ORDER BY p.id
+    LIMIT %s"""
 
 CREATE_SALE = """
     INSERT INTO sale_records(items, total, attendant_id)
     VALUES(%s, %s, %s)
     RETURNING id, items, total, attendant_id, date_created;"""
 
+CREATE_SALES = """
+    INSERT INTO sale_records(items, total, attendant_id)
+    VALUES %s
+    RETURNING id, items, total, attendant_id, date_created"""
+
 GET_SALE = """
     SELECT id, items, total, attendant_id, date_created
     FROM sale_records
@@ -138,17 +333,79 @@ GET_ALL_SALES = """
     FROM sale_records
     ORDER BY id"""
 
-GET_ALL_SALES_BY_ATTENDANT = """
+GET_SALES_PAGE = """
     SELECT id, items, total, attendant_id, date_created
     FROM sale_records
-    WHERE attendant_id = %s
-    ORDER BY id"""
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s"""
+
+GET_SALES_PAGE_BY_ATTENDANT = """
+    SELECT id, items, total, attendant_id, date_created
+    FROM sale_records
+    WHERE attendant_id = %s AND id > %s
+    ORDER BY id
+    LIMIT %s"""
 
 CREATE_SALE_ITEM = """
     INSERT INTO sale_record_items(product_name,price,quantity,total,sale_id)
     VALUES(%s, %s, %s, %s, %s)"""
 # RETURNING product_id, price, quantity, total;"""
 
+CREATE_SALE_ITEMS = """
+    INSERT INTO sale_record_items(product_name, price, quantity, total, sale_id)
+    VALUES %s"""
+
+UPSERT_SALES_ROLLUP = """
+    INSERT INTO sales_daily_rollup(day, attendant_id, product_name,
+    quantity, revenue)
+    VALUES %s
+    ON CONFLICT (day, attendant_id, product_name) DO UPDATE
+    SET quantity = sales_daily_rollup.quantity + EXCLUDED.quantity,
+    revenue = sales_daily_rollup.revenue + EXCLUDED.revenue"""
+
+# rows of UPSERT_SALES_ROLLUP are dated like the sale records they sum
+SALES_ROLLUP_VALUES = "(CURRENT_DATE, %s, %s, %s, %s)"
+
+BACKFILL_SALES_ROLLUP = """
+    INSERT INTO sales_daily_rollup(day, attendant_id, product_name,
+    quantity, revenue)
+    SELECT s.date_created, COALESCE(s.attendant_id, 0), i.product_name,
+    SUM(i.quantity), SUM(i.total)
+    FROM sale_records s
+    JOIN sale_record_items i ON i.sale_id = s.id
+    WHERE NOT EXISTS (SELECT 1 FROM sales_daily_rollup)
+    GROUP BY 1, 2, 3
+    ON CONFLICT DO NOTHING"""
+
+GET_SALES_REPORT = {
+    'day': """
+        SELECT day, SUM(quantity)::bigint, SUM(revenue)::bigint
+        FROM sales_daily_rollup
+        WHERE day BETWEEN %s AND %s
+        GROUP BY day
+        ORDER BY day""",
+    'week': """
+        SELECT date_trunc('week', day)::date AS week,
+        SUM(quantity)::bigint, SUM(revenue)::bigint
+        FROM sales_daily_rollup
+        WHERE day BETWEEN %s AND %s
+        GROUP BY week
+        ORDER BY week""",
+    'attendant': """
+        SELECT attendant_id, SUM(quantity)::bigint, SUM(revenue)::bigint
+        FROM sales_daily_rollup
+        WHERE day BETWEEN %s AND %s
+        GROUP BY attendant_id
+        ORDER BY attendant_id""",
+    'product': """
+        SELECT product_name, SUM(quantity)::bigint, SUM(revenue)::bigint
+        FROM sales_daily_rollup
+        WHERE day BETWEEN %s AND %s
+        GROUP BY product_name
+        ORDER BY product_name""",
+}
+
 GET_SALE_ITEMS = """
     SELECT product_name, price, quantity, total
     FROM sale_record_items
@@ -179,10 +436,12 @@ UPDATE_USER = """
     SET name = %s, password = %s
     WHERE id = %s"""
 
-GET_ALL_USERS = """
+GET_USERS_PAGE = """
     SELECT id, name, role
     FROM users
-    ORDER BY id"""
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s"""
 
 CHECK_ADMIN_EXISTS = """
     SELECT 1
@@ -195,6 +454,12 @@ REVOKE_TOKEN = """
     VALUES(%s)
     RETURNING id, token"""
 
+GET_REVOKED_TOKENS_SINCE = """
+    SELECT id, token
+    FROM tokens
+    WHERE id > %s
+    ORDER BY id"""
+
 CHECK_TOKEN_VALIDITY = """
     SELECT token
     FROM TOKENS
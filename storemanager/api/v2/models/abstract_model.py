@@ -2,49 +2,115 @@
 This module contains the Generic Model
 UserModel, ProductModel and SaleRecordModel inherit from AbstractModel
 """
-from storemanager.api.v2.database.database import execute_query
+from storemanager.api.v2.database.database import DB, execute_query
+from storemanager.api.v2.models.cache import MODEL_CACHES, MISSING
 
 
 class AbstractModel:
     """ Model class for AbstractModel. """
 
+    # seconds that rows read through get_by_id, get_by_name, get_all,
+    # get_all_by_id and get_one are cached for, None disables the cache
+    cache_ttl = None
+    # number of distinct reads kept in the cache
+    cache_size = 1000
+
     def __init__(self):
         self.id = int
         self.created = str
 
     def save(self, statement, values):
         """create a new item using the entity details specified"""
-        return execute_query([statement, values], "one")
+        result = execute_query([statement, values], "one")
+        type(self).clear_cache()
+        return result
 
     @classmethod
-    def get_by_id(cls, statement, value):
-        """Retrieve the entity with the specified id"""
-        return execute_query([statement, value], "one")
+    def get_by_id(cls, statement, value, cached=True):
+        """
+        Retrieve the entity with the specified id, checks guarding a write
+        pass cached=False since other workers' writes do not clear this
+        worker's cache
+        """
+        if not cached:
+            return execute_query([statement, value], "one")
+        return cls.cached_query([statement, value], "one")
 
     def delete(self, statement, value):
         """Delete the entity with the specified id"""
-        return execute_query([statement, value], "one_row_count")
+        result = execute_query([statement, value], "one_row_count")
+        type(self).clear_cache()
+        return result
 
     def update(self, statement, values):
         """Update the entity with the specified id"""
-        return execute_query([statement, values], "one_row_count")
+        result = execute_query([statement, values], "one_row_count")
+        type(self).clear_cache()
+        return result
 
     @classmethod
     def get_all(cls, statement):
         """Returns multiple rows of the type of entity"""
-        return execute_query([statement], "many_no_values")
+        return cls.cached_query([statement], "many_no_values")
+
+    @classmethod
+    def get_page(cls, statement, after_id, limit, values=()):
+        """
+        Returns up to limit rows with an id above after_id, statement has
+        to filter on id > %s, order by id and take a LIMIT parameter,
+        after the parameters in values of any other filter.
+        Also returns the after_id of the next page, None on the last page.
+        """
+        rows = execute_query(
+            [statement, tuple(values) + (after_id, limit + 1)], "many")
+        if len(rows) > limit:
+            return rows[:limit], rows[limit - 1][0]
+        return rows, None
 
     @classmethod
     def get_one(cls, statement):
         """Returns one row result"""
-        return execute_query([statement], "one")
+        return cls.cached_query([statement], "one")
 
     @classmethod
     def get_all_by_id(cls, statement, values):
         """Returns all entities which contain the specified id"""
-        return execute_query([statement, values], "many")
+        return cls.cached_query([statement, values], "many")
+
+    @classmethod
+    def get_by_name(cls, statement, value, cached=True):
+        """Returns the entity with the specified name, see get_by_id"""
+        if not cached:
+            return execute_query([statement, value], "one")
+        return cls.cached_query([statement, value], "one")
+
+    @classmethod
+    def cached_query(cls, query, flag):
+        """
+        Run a read through the model's cache, keyed on statement and
+        parameters. Empty results are not cached, so an entity that
+        does not exist yet is found as soon as it is created.
+        """
+        cache = MODEL_CACHES.get(cls)
+        if cache is None:
+            return execute_query(query, flag)
+
+        key = (query[0], tuple(query[1]) if len(query) > 1 else None)
+        result = cache.get(key)
+        if result is MISSING:
+            result = execute_query(query, flag)
+            if result:
+                cache.set(key, result)
+        return result
 
     @classmethod
-    def get_by_name(cls, statement, value):
-        """Returns the entity with the specified name"""
-        return execute_query([statement, value], "one")
+    def clear_cache(cls):
+        """
+        Drop every cached read of the model, called after writes. It is
+        cleared again once the write commits, as reads made in between
+        may have cached the rows as they were before the write.
+        """
+        cache = MODEL_CACHES.get(cls)
+        if cache is not None:
+            cache.clear()
+            DB.after_commit(cache.clear)
@@ -0,0 +1,121 @@
+"""
+This module contains the caches used by the models to avoid repeating
+identical reads. CacheBackend is the interface a backend implements,
+MemoryCache is the in process, per worker implementation used by default.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# returned by CacheBackend.get for keys that are not cached, since None
+# is a value that can be cached
+MISSING = object()
+
+
+class CacheBackend:
+    """Interface of a model cache, a shared backend implements the same"""
+
+    def get(self, key):
+        """cached value of key or MISSING"""
+        raise NotImplementedError
+
+    def set(self, key, value, ttl=None):
+        """cache value under key for ttl seconds, or the default ttl"""
+        raise NotImplementedError
+
+    def clear(self):
+        """remove every entry"""
+        raise NotImplementedError
+
+    def stats(self):
+        """dict of counters used to tune the cache"""
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """Thread-safe LRU cache whose entries expire after ttl seconds"""
+
+    def __init__(self, max_size=1000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'size': len(self._entries),
+                    'max_size': self.max_size}
+
+
+class ModelCaches:
+    """The cache of each model, created on first use by backend_factory"""
+
+    def __init__(self, backend_factory=MemoryCache):
+        self.backend_factory = backend_factory
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._caches = {}
+
+    def configure(self, enabled=True, backend_factory=None):
+        """
+        Switch model caching on or off, backend_factory(max_size, ttl)
+        replaces the backend of caches created from now on
+        """
+        self.enabled = enabled
+        if backend_factory is not None:
+            self.backend_factory = backend_factory
+        with self._lock:
+            self._caches = {}
+
+    def get(self, model):
+        """cache of the model class, None if it does not use one"""
+        if not self.enabled or model.cache_ttl is None:
+            return None
+        name = model.__name__
+        if name not in self._caches:
+            with self._lock:
+                if name not in self._caches:
+                    self._caches[name] = self.backend_factory(
+                        max_size=model.cache_size, ttl=model.cache_ttl)
+        return self._caches[name]
+
+    def stats(self):
+        """stats of every cache created so far, keyed by model name"""
+        with self._lock:
+            caches = dict(self._caches)
+        return {name: cache.stats() for name, cache in caches.items()}
+
+
+MODEL_CACHES = ModelCaches()
@@ -1,8 +1,16 @@
+import threading
+import time
+
 from .abstract_model import AbstractModel
+from storemanager.api.v2.database.database import DB, execute_query
+from storemanager.api.v2.database.queries import *
 
 
 class CategoryModel(AbstractModel):
 
+    # not cached, the version checked CATEGORY_CACHE serves the lookups
+    # that need to be fast
+
     def __init__(self):
         super().__init__()
         self.name = str
@@ -13,9 +21,9 @@ class CategoryModel(AbstractModel):
         return super().save(statement, values)
 
     @classmethod
-    def get_by_id(cls, statement, value):
+    def get_by_id(cls, statement, value, cached=True):
         """retrieves one category with the specified id"""
-        return super().get_by_id(statement, value)
+        return super().get_by_id(statement, value, cached)
 
     def delete(self, statement, value):
         """deletes a category from the categories table"""
@@ -26,8 +34,8 @@ class CategoryModel(AbstractModel):
         return super().update(statement, values)
 
     @classmethod
-    def get_by_name(cls, statement, value):
-        return super().get_by_name(statement, value)
+    def get_by_name(cls, statement, value, cached=True):
+        return super().get_by_name(statement, value, cached)
 
     @classmethod
     def get_all(cls, statement):
@@ -41,3 +49,95 @@ class CategoryModel(AbstractModel):
                 'description': self.description,
                 'date_created': self.created
                 }
+
+
+class CategoryCache:
+    """
+    Per worker copy of the categories table, looked up by id or name.
+    Writes bump the categories row of table_versions so that every worker
+    notices them with a cheap version check, made at most once per
+    check_interval seconds.
+    """
+
+    def __init__(self, check_interval=2):
+        self.configure(check_interval)
+
+    def configure(self, check_interval):
+        """set the seconds between version checks, clears the cache"""
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._by_id = {}
+        self._by_name = {}
+        self._version = None
+        self._checked_at = None
+        self.hits = 0
+        self.misses = 0
+
+    def get_by_id(self, category_id):
+        """category row (id, name, description, date_created) or None"""
+        category = self._load()[0].get(int(category_id))
+        if category is None:
+            # it may have been created by another worker since the last
+            # version check, so check again before reporting it missing
+            category = self._load(force=True)[0].get(int(category_id))
+        return category
+
+    def get_by_name(self, name):
+        """category row (id, name, description, date_created) or None"""
+        category = self._load()[1].get(name)
+        if category is None:
+            category = self._load(force=True)[1].get(name)
+        return category
+
+    def invalidate(self):
+        """
+        Bump the categories version, to be called after writing to the
+        categories table and in the same transaction
+        """
+        execute_query([BUMP_TABLE_VERSION, ('categories',)], "one")
+        with self._lock:
+            self._checked_at = None
+
+    def expire(self):
+        """check the version on the next lookup, for rows found stale"""
+        with self._lock:
+            self._checked_at = None
+
+    def stats(self):
+        """hit and miss counts, a miss is a lookup that reloaded the table"""
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._by_id), 'version': self._version}
+
+    def _load(self, force=False):
+        now = time.monotonic()
+        with self._lock:
+            if force or self._checked_at is None or \
+                    now - self._checked_at >= self.check_interval:
+                self._check_version()
+                self._checked_at = now
+            else:
+                self.hits += 1
+            return self._by_id, self._by_name
+
+    def _check_version(self):
+        # a connection of its own so uncommitted writes of the current
+        # request are never cached, the version is read before the rows
+        # so the rows are never older than the version they are cached as
+        with DB.connection(request_scoped=False) as conn:
+            cur = conn.cursor()
+            cur.execute(GET_TABLE_VERSION, ('categories',))
+            row = cur.fetchone()
+            version = 0 if row is None else row[0]
+            if version == self._version:
+                self.hits += 1
+                return
+            cur.execute(GET_ALL_CATEGORIES)
+            rows = cur.fetchall()
+            cur.close()
+        self._by_id = {row[0]: row for row in rows}
+        self._by_name = {row[1]: row for row in rows}
+        self._version = version
+        self.misses += 1
+
+
+CATEGORY_CACHE = CategoryCache()
@@ -0,0 +1,167 @@
+"""
+This module contains the checkout engine which records sales.
+The stock check, the stock update, the sale inserts and the update of
+the daily sales rollup all run in one transaction with the sold products
+locked, so concurrent sales of the same product cannot overwrite each
+other's stock updates.
+"""
+from collections import OrderedDict
+
+from psycopg2.extras import execute_values
+
+from storemanager.api.v2.database.database import DB, execute_values_returning
+from storemanager.api.v2.database.queries import *
+from storemanager.api.v2.models.product import ProductModel
+from storemanager.api.v2.models.sale_record import SaleRecordModelItem
+
+
+class CheckoutError(Exception):
+    """Raised when a sale cannot be made, the message is the reason"""
+
+
+def cart_quantities(cart):
+    """total quantity of each product in cart, in the order of the cart"""
+    quantities = OrderedDict()
+    for name, quantity in cart:
+        quantities[name] = quantities.get(name, 0) + quantity
+    return quantities
+
+
+def check_stock(quantities, products, stock):
+    """
+    Raise CheckoutError unless every product in quantities exists and
+    has enough of its stock, a dict of name to units, above its minimum
+    """
+    for name, quantity in quantities.items():
+        product = products.get(name)
+        if product is None:
+            raise CheckoutError(
+                'product named {} does not exist'.format(name))
+        if stock[name] - quantity < product[4]:
+            raise CheckoutError(
+                'cannot sell past minimum stock for {}'.format(name))
+
+
+def decrement_stock(cur, quantities, products):
+    """
+    Take quantities, a dict of product name to units, off the stock of the
+    products, raising CheckoutError if the guarded update left any of them
+    unchanged, which rolls the sale back
+    """
+    short = ProductModel.decrement_stock(
+        cur, OrderedDict((products[name][0], quantity)
+                         for name, quantity in quantities.items()))
+    if short:
+        name = next(name for name, product in products.items()
+                    if product[0] in short)
+        raise CheckoutError(
+            'cannot sell past minimum stock for {}'.format(name))
+
+
+def sale_lines(cart, products):
+    """(name, price, quantity, cost) of each cart entry"""
+    return [(name, products[name][2], quantity, products[name][2] * quantity)
+            for name, quantity in cart]
+
+
+def rollup_rows(attendant_id, lines):
+    """
+    UPSERT_SALES_ROLLUP rows adding the quantity and revenue of the sale
+    lines, one per product and in name order so concurrent upserts lock
+    the rollup rows in the same order
+    """
+    totals = {}
+    for name, _, quantity, cost in lines:
+        quantity_sum, cost_sum = totals.get(name, (0, 0))
+        totals[name] = (quantity_sum + quantity, cost_sum + cost)
+    return [(attendant_id, name) + totals[name] for name in sorted(totals)]
+
+
+def create_sale(cart, attendant_id):
+    """
+    Sell the (product name, quantity) pairs in cart on behalf of the
+    attendant. Returns the CREATE_SALE row, raises CheckoutError if a
+    product does not exist or does not have enough stock.
+    """
+    quantities = cart_quantities(cart)
+
+    with DB.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(GET_PRODUCTS_FOR_SALE, (list(quantities),))
+        products = {row[1]: row for row in cur.fetchall()}
+        check_stock(quantities, products,
+                    {name: product[3] for name, product in products.items()})
+
+        decrement_stock(cur, quantities, products)
+
+        lines = sale_lines(cart, products)
+        items_count = sum(line[2] for line in lines)
+        total_cost = sum(line[3] for line in lines)
+
+        cur.execute(CREATE_SALE, (items_count, total_cost, attendant_id))
+        sale = cur.fetchone()
+        execute_values(cur, CREATE_SALE_ITEMS,
+                       [line + (sale[0],) for line in lines],
+                       page_size=SaleRecordModelItem.save_page_size)
+        execute_values(cur, UPSERT_SALES_ROLLUP,
+                       rollup_rows(attendant_id, lines),
+                       template=SALES_ROLLUP_VALUES)
+        cur.close()
+
+    return sale
+
+
+def create_sales(carts, attendant_id):
+    """
+    Sell many carts in one transaction, for tills replaying the sales
+    they made while offline. Carts are sold in order and a cart that
+    cannot be sold is skipped without affecting the others. Returns, for
+    each cart, its CREATE_SALE row or the CheckoutError it failed with.
+    """
+    names = sorted({name for cart in carts for name, _ in cart})
+
+    with DB.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(GET_PRODUCTS_FOR_SALE, (names,))
+        products = {row[1]: row for row in cur.fetchall()}
+        stock = {name: product[3] for name, product in products.items()}
+
+        results = []
+        sold = []
+        decrements = OrderedDict()
+        for cart in carts:
+            quantities = cart_quantities(cart)
+            try:
+                if not quantities:
+                    raise CheckoutError('sale has no products')
+                check_stock(quantities, products, stock)
+            except CheckoutError as error:
+                results.append(error)
+                continue
+            for name, quantity in quantities.items():
+                stock[name] -= quantity
+                decrements[name] = decrements.get(name, 0) + quantity
+            sold.append((len(results), sale_lines(cart, products)))
+            results.append(None)
+
+        if sold:
+            decrement_stock(cur, decrements, products)
+            sales = execute_values_returning(
+                cur, CREATE_SALES,
+                [(sum(line[2] for line in lines),
+                  sum(line[3] for line in lines),
+                  attendant_id) for _, lines in sold])
+            items = []
+            # ids are handed out in the order of the VALUES list
+            for (position, lines), sale in zip(sold, sorted(sales)):
+                results[position] = sale
+                items.extend(line + (sale[0],) for line in lines)
+            execute_values(cur, CREATE_SALE_ITEMS, items,
+                           page_size=SaleRecordModelItem.save_page_size)
+            execute_values(cur, UPSERT_SALES_ROLLUP,
+                           rollup_rows(attendant_id,
+                                       [item[:4] for item in items]),
+                           template=SALES_ROLLUP_VALUES)
+        cur.close()
+
+    return results
@@ -1,11 +1,17 @@
 """ This module contains the Product model."""
 from .abstract_model import AbstractModel
-from storemanager.api.v2.database.database import execute_query
+from storemanager.api.v2.database.database import DB, execute_values_returning
+from storemanager.api.v2.database.queries import (
+    BUMP_PRODUCTS_VERSION, DECREMENT_PRODUCT_STOCK)
+from storemanager.api.v2.utils.converters import date_to_string
 
 
 class ProductModel(AbstractModel):
     """Model class for Product."""
 
+    # stock changes made by sales are not invalidated, keep this short
+    cache_ttl = 5
+
     def __init__(self):
         """Parameters name, price, description, category, stock, min_stock"""
         super().__init__()
@@ -18,20 +24,69 @@ class ProductModel(AbstractModel):
 
     def save(self, statement, values):
         """Adds a new product"""
-        return super().save(statement, values)
+        result = super().save(statement, values)
+        self.touch()
+        return result
 
     def delete(self, statement, value):
         """deletes a product"""
-        return super().delete(statement, value)
+        result = super().delete(statement, value)
+        self.touch()
+        return result
 
     def update(self, statement, values):
         """updates details of an existing product"""
-        return super().update(statement, values)
+        result = super().update(statement, values)
+        self.touch()
+        return result
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Builds a Product from a row of GET_PRODUCT_WITH_CATEGORY,
+        GET_PRODUCTS_PAGE or CREATE_PRODUCT, all of which carry the
+        category name so no further lookup is needed
+        """
+        product = cls()
+        product.id = row[0]
+        product.name = row[1]
+        product.price = row[2]
+        product.stock = row[3]
+        product.min_stock = row[4]
+        product.description = row[5]
+        product.created = date_to_string(row[6])
+        product.category = row[7]
+        return product
 
     @classmethod
-    def update_on_sale(cls, statement, values):
-        """updates stock value of product after sale"""
-        execute_query([statement, values], "one_row_count")
+    def decrement_stock(cls, cur, quantities):
+        """
+        Takes quantities, a dict of product id to units, off the products'
+        stock in a single statement on cur, as long as each stock stays at
+        or above its minimum. Returns the ids that were left unchanged,
+        for lack of stock or of such a product, in which case the caller
+        has to roll back the products that were changed.
+        """
+        updated = execute_values_returning(
+            cur, DECREMENT_PRODUCT_STOCK, list(quantities.items()))
+        cls.touch()
+        return set(quantities) - {row[0] for row in updated}
+
+    @classmethod
+    def touch(cls):
+        """
+        Bump the products version once the current transaction commits,
+        to be called after every write that changes the product listing
+        """
+        DB.after_commit(cls._bump_version)
+
+    @staticmethod
+    def _bump_version():
+        # a sequence rather than a table_versions row so concurrent sales
+        # do not queue on a row lock, bumped after the commit so a version
+        # is never seen before the rows it stands for
+        with DB.connection(request_scoped=False) as conn:
+            conn.cursor().execute(BUMP_PRODUCTS_VERSION)
 
     def as_dict(self):
         """Converts Product to dict() object."""
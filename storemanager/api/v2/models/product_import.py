@@ -0,0 +1,45 @@
+"""
+This module contains the bulk product import. The rows are copied into
+a temporary staging table with COPY and moved into products by a single
+INSERT, so the cost of an import hardly depends on its number of rows.
+"""
+import csv
+import io
+
+from storemanager.api.v2.database.database import DB
+from storemanager.api.v2.database.queries import *
+from storemanager.api.v2.models.product import ProductModel
+
+
+def get_category_ids(names):
+    """dict of category name to id, for the names that exist"""
+    with DB.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(GET_CATEGORY_IDS_BY_NAME, (list(names),))
+        category_ids = dict(cur.fetchall())
+        cur.close()
+    return category_ids
+
+
+def import_products(rows):
+    """
+    Add rows of (line, name, price, stock, min_stock, description,
+    category id), products whose name is taken are skipped. Returns the
+    set of names that were added.
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    with DB.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(CREATE_PRODUCT_STAGING)
+        cur.copy_expert(COPY_PRODUCT_STAGING, buffer)
+        cur.execute(INSERT_STAGED_PRODUCTS)
+        added = {row[0] for row in cur.fetchall()}
+        cur.close()
+
+    if added:
+        ProductModel.clear_cache()
+        ProductModel.touch()
+    return added
@@ -1,12 +1,13 @@
 """ This module contains the Sale Record model."""
-import psycopg2
 from .abstract_model import AbstractModel
-from storemanager.api.v2.database.database import DB
 
 
 class SaleRecordModel(AbstractModel):
     """Model class for Sale Record."""
 
+    # sale records are never changed once created
+    cache_ttl = 300
+
     def __init__(self):
         """ Parameters products, items and total cost. """
         super().__init__()
@@ -32,6 +33,11 @@ class SaleRecordModel(AbstractModel):
 
 
 class SaleRecordModelItem(AbstractModel):
+
+    cache_ttl = 300
+    # sale items sent in each multi-row CREATE_SALE_ITEMS statement
+    save_page_size = 1000
+
     def __init__(self):
         """ Parameters products, items and total cost. """
         super().__init__()
@@ -41,21 +47,6 @@ class SaleRecordModelItem(AbstractModel):
         self.product_total = int
         self.sale_id = int
 
-    def save(self, statement, values):
-        """Adds a new sale item"""
-        conn = None
-        try:
-            conn = DB.connect()
-            cur = conn.cursor()
-            cur.executemany(statement, values)
-            conn.commit()
-            cur.close()
-        except (Exception, psycopg2.DatabaseError) as error:
-            print(error)
-        finally:
-            if conn is not None:
-                conn.close()
-
     def delete(self, statement, value):
         """deletes a sale item"""
         return super().delete(statement, value)
@@ -0,0 +1,35 @@
+""" This module contains the Sales Report model."""
+from datetime import date
+
+from .abstract_model import AbstractModel
+from storemanager.api.v2.database.queries import GET_SALES_REPORT
+from storemanager.api.v2.utils.converters import date_to_string
+
+
+class SalesReportModel(AbstractModel):
+    """Sales totals of a group, read from the daily sales rollup."""
+
+    # what reports can be grouped by, the first is the default
+    GROUPS = ('day', 'week', 'attendant', 'product')
+
+    def __init__(self):
+        """Parameters group_by, group, quantity and revenue"""
+        super().__init__()
+        self.group_by = str
+        self.group = None
+        self.quantity = int
+        self.revenue = int
+
+    @classmethod
+    def get_report(cls, group_by, start, end):
+        """(group, quantity, revenue) rows of the days from start to end"""
+        return cls.get_all_by_id(GET_SALES_REPORT[group_by], (start, end))
+
+    def as_dict(self):
+        """Converts Sales Report entry to dict() object."""
+        group = self.group
+        if isinstance(group, date):
+            group = date_to_string(group)
+        return {self.group_by: group,
+                'quantity': self.quantity,
+                'revenue': self.revenue}
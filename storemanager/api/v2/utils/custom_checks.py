@@ -2,19 +2,53 @@
 This module contains a fuction check_user_admin that checks whether the
 current user who is accessing an endpoint has a role of admin.
 """
-from flask import abort
-from flask_jwt_extended import get_jwt_identity
+from flask import abort, current_app
+from flask_jwt_extended import get_jwt_identity, get_jwt_claims
 
 from storemanager.api.v2.models.user import UserModel
+from storemanager.api.v2.models.cache import MemoryCache, MISSING
 from storemanager.api.v2.database.queries import *
 from storemanager.api.v2.database.database import execute_query
+from storemanager.api.v2.utils.revoked_tokens import REVOKED_TOKENS
+
+
+# user id -> role, or None if the user was deleted
+USER_ROLES = MemoryCache(max_size=10000)
+
+
+def get_user_claims():
+    """
+    Returns (id, role) of the current user from the access token claims.
+    With USER_CLAIMS_TTL set the role is read again from the database at
+    most once per that many seconds, so that role changes and deleted
+    users are noticed. Tokens issued without claims are always looked up.
+    """
+    claims = get_jwt_claims()
+    if 'id' not in claims:
+        user_details = UserModel.get_by_name(
+            GET_USER_BY_NAME, (get_jwt_identity(),))
+        if user_details is None:
+            abort(401, 'user no longer exists')
+        return user_details[0], user_details[3]
+
+    ttl = current_app.config['USER_CLAIMS_TTL']
+    if not ttl:
+        return claims['id'], claims['role']
+
+    role = USER_ROLES.get(claims['id'])
+    if role is MISSING:
+        user_details = UserModel.get_by_id(GET_USER, (claims['id'],))
+        role = None if user_details is None else user_details[2]
+        USER_ROLES.set(claims['id'], role, ttl)
+    if role is None:
+        abort(401, 'user no longer exists')
+    return claims['id'], role
 
 
 def check_user_admin():
     """check whether user is an admin"""
-    current_user = get_jwt_identity()
-    user_details = UserModel.get_by_name(GET_USER_BY_NAME, (current_user,))
-    if user_details[3] != "admin":
+    _, role = get_user_claims()
+    if role != "admin":
         abort(401, 'action failed, user is not administrator')
 
 
@@ -26,7 +60,7 @@ def check_id_integer(entity_id):
 
 def check_admin_exists():
     """check whether user with role 'admin' already exists in database"""
-    admin = execute_query([CHECK_ADMIN_EXISTS], "one_row_count")
+    admin = execute_query([CHECK_ADMIN_EXISTS], "one")
     if admin is not None:
         abort(400, 'admin user already exists')
 
@@ -34,10 +68,6 @@ def check_admin_exists():
 def is_token_revoked(token):
     """
     Checks whether the token passed in the authorization header
-    is in the revoked tokens table
+    is in the revoked tokens table, answered from the in memory copy
     """
-    result = execute_query([CHECK_TOKEN_VALIDITY, (token,)], "one")
-    if not result:
-        return False
-
-    return True
+    return REVOKED_TOKENS.is_revoked(token)
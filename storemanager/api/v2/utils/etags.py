@@ -0,0 +1,42 @@
+"""
+This module contains the helpers for conditional GETs of the catalogue.
+The tag of a listing is made of the versions of the tables it is read
+from and the request's path and query string, so it can be checked
+against If-None-Match before any row is read.
+"""
+import hashlib
+
+from flask import request, Response
+from werkzeug.http import quote_etag
+
+from storemanager.api.v2.database.database import DB
+from storemanager.api.v2.database.queries import GET_CATALOGUE_VERSIONS
+
+
+def catalogue_etag(*tables):
+    """
+    ETag of the current request over tables, which may be 'products'
+    and 'categories'. The versions are read before the listing's rows so
+    the rows are never older than the tag they are sent with.
+    """
+    with DB.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(GET_CATALOGUE_VERSIONS)
+        row = cur.fetchone()
+        cur.close()
+    versions = {'products': row[0], 'categories': row[1] or 0}
+    path = hashlib.md5(request.full_path.encode('utf-8')).hexdigest()
+    return '-'.join(['{}{}'.format(table[0], versions[table])
+                     for table in tables] + [path[:16]])
+
+
+def not_modified(etag):
+    """a 304 response if the client already has etag, otherwise None"""
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=etag_header(etag))
+    return None
+
+
+def etag_header(etag):
+    """headers sending etag along with a response"""
+    return {'ETag': quote_etag(etag)}
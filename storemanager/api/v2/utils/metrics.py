@@ -0,0 +1,129 @@
+"""
+This module contains the metrics exported in Prometheus text format at
+/metrics: request counts and latencies per resource and status code, the
+connection pool's occupancy and the hits and misses of the caches.
+
+Under gunicorn every worker is a separate process. When the
+prometheus_multiproc_dir environment variable names a directory, which
+gunicorn.conf.py takes care of, each worker writes its metrics there and
+/metrics adds up those of all workers, whichever worker serves it.
+"""
+import os
+import time
+
+from flask import Response, current_app, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+    Histogram, generate_latest)
+from prometheus_client import multiprocess
+
+from storemanager.api.v2.database.database import DB
+from storemanager.api.v2.database.instrumentation import QUERY_STATS
+from storemanager.api.v2.models.cache import MODEL_CACHES
+from storemanager.api.v2.models.category import CATEGORY_CACHE
+
+MULTIPROCESS_DIR = 'prometheus_multiproc_dir'
+
+REQUESTS = Counter(
+    'storemanager_requests_total', 'Requests served',
+    ['resource', 'method', 'status'])
+REQUEST_SECONDS = Histogram(
+    'storemanager_request_seconds', 'Time taken to serve a request',
+    ['resource', 'method', 'status'])
+REQUEST_DB_SECONDS = Histogram(
+    'storemanager_request_db_seconds',
+    'Time the statements of a request took',
+    ['resource', 'method'])
+
+# gauges are summed over the live workers, a worker's values disappear
+# when it exits
+POOL_CONNECTIONS = Gauge(
+    'storemanager_db_pool_connections', 'Pooled database connections',
+    ['state'], multiprocess_mode='livesum')
+CACHE_HITS = Gauge(
+    'storemanager_cache_hits', 'Cache lookups served from the cache',
+    ['cache'], multiprocess_mode='livesum')
+CACHE_MISSES = Gauge(
+    'storemanager_cache_misses', 'Cache lookups that went to the database',
+    ['cache'], multiprocess_mode='livesum')
+CACHE_HIT_RATIO = Gauge(
+    'storemanager_cache_hit_ratio', 'Share of cache lookups that were hits',
+    ['cache'], multiprocess_mode='liveall')
+
+
+def resource_name():
+    """name of the resource class serving the request, bounded in number"""
+    view = current_app.view_functions.get(request.endpoint)
+    if view is None:
+        return 'unmatched'
+    view_class = getattr(view, 'view_class', None)
+    return view_class.__name__ if view_class is not None else request.endpoint
+
+
+def cache_stats():
+    """hits and misses of every cache, keyed by cache name"""
+    stats = MODEL_CACHES.stats()
+    stats['Category'] = CATEGORY_CACHE.stats()
+    return stats
+
+
+class Metrics:
+    """Records the metrics of each request and serves /metrics"""
+
+    def __init__(self):
+        self.gauge_interval = 5
+        self._gauges_at = None
+
+    def init_app(self, app):
+        self.gauge_interval = app.config['METRICS_GAUGE_INTERVAL']
+        app.before_request(self.start_request)
+        app.after_request(self.end_request)
+        app.add_url_rule('/metrics', 'metrics', self.export)
+
+    def start_request(self):
+        g.metrics_started = time.perf_counter()
+
+    def end_request(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        resource = resource_name()
+        status = str(response.status_code)
+        REQUESTS.labels(resource, request.method, status).inc()
+        REQUEST_SECONDS.labels(resource, request.method, status).observe(
+            time.perf_counter() - started)
+        REQUEST_DB_SECONDS.labels(resource, request.method).observe(
+            QUERY_STATS.request_stats()[1])
+
+        # reading the pool and caches takes their locks, so every worker
+        # publishes them at most once per gauge_interval
+        now = time.monotonic()
+        if self._gauges_at is None or \
+                now - self._gauges_at >= self.gauge_interval:
+            self._gauges_at = now
+            self.update_gauges()
+        return response
+
+    def update_gauges(self):
+        for state, count in DB.pool.stats().items():
+            POOL_CONNECTIONS.labels(state).set(count)
+        for name, stats in cache_stats().items():
+            lookups = stats['hits'] + stats['misses']
+            CACHE_HITS.labels(name).set(stats['hits'])
+            CACHE_MISSES.labels(name).set(stats['misses'])
+            CACHE_HIT_RATIO.labels(name).set(
+                stats['hits'] / lookups if lookups else 0)
+
+    def export(self):
+        """metrics of every worker in Prometheus text format"""
+        self.update_gauges()
+        if os.environ.get(MULTIPROCESS_DIR):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        else:
+            registry = REGISTRY
+        return Response(generate_latest(registry),
+                        content_type=CONTENT_TYPE_LATEST)
+
+
+METRICS = Metrics()
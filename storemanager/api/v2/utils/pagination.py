@@ -0,0 +1,20 @@
+"""
+This module contains the function get_page_args which reads the keyset
+pagination parameters of list endpoints from the query string.
+"""
+from flask import abort, current_app, request
+
+
+def get_page_args():
+    """
+    Returns (after_id, limit) from ?after_id=&limit=, limit defaults to
+    PAGE_SIZE and is capped at MAX_PAGE_SIZE
+    """
+    after_id = request.args.get('after_id', '0')
+    limit = request.args.get('limit', str(current_app.config['PAGE_SIZE']))
+    if not after_id.isdigit():
+        abort(400, 'after_id should be a positive integer')
+    if not limit.isdigit() or int(limit) == 0:
+        abort(400, 'limit should be a positive integer')
+
+    return int(after_id), min(int(limit), current_app.config['MAX_PAGE_SIZE'])
@@ -0,0 +1,37 @@
+"""
+This module contains the function get_report_args which reads the range
+and grouping of a report from the query string.
+"""
+from datetime import date, datetime, timedelta
+
+from flask import abort, request
+
+# days covered by a report when ?from= is not given
+DEFAULT_REPORT_DAYS = 30
+
+
+def parse_date(name):
+    """the ?name= date of the query string, None if it is not given"""
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        abort(400, '{} should be a date formatted as YYYY-MM-DD'.format(name))
+
+
+def get_report_args(groups):
+    """
+    Returns (start, end, group_by) from ?from=&to=&group_by=, the range
+    defaults to the last DEFAULT_REPORT_DAYS days up to today and
+    group_by to the first of groups
+    """
+    end = parse_date('to') or date.today()
+    start = parse_date('from') or end - timedelta(days=DEFAULT_REPORT_DAYS - 1)
+    if start > end:
+        abort(400, 'from should not be after to')
+    group_by = request.args.get('group_by', groups[0])
+    if group_by not in groups:
+        abort(400, 'group_by should be one of {}'.format(', '.join(groups)))
+    return start, end, group_by
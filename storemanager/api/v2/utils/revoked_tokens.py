@@ -0,0 +1,75 @@
+"""
+This module contains the RevokedTokens class, a per worker copy of the
+revoked token ids stored in the tokens table. It lets the token check
+answer from memory instead of querying the database on every request.
+"""
+import threading
+import time
+
+from storemanager.api.v2.database.database import DB, execute_query
+from storemanager.api.v2.database.queries import *
+
+# tokens revoked by transactions that committed out of id order would be
+# skipped by a plain "id above the last one seen" scan, so every refresh
+# looks this many ids back
+REFRESH_LOOKBACK = 100
+
+
+class RevokedTokens:
+    """Bounded in memory set of revoked token ids, refreshed periodically"""
+
+    def __init__(self, max_size=100000, refresh_interval=5):
+        self.configure(max_size, refresh_interval)
+
+    def configure(self, max_size, refresh_interval):
+        """set the size bound and the seconds between refreshes, clears the set"""
+        self.max_size = max_size
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._tokens = set()
+        self._last_id = 0
+        self._refreshed_at = None
+        self._overflow = False
+
+    def refresh(self):
+        """load the tokens revoked since the last refresh, by any worker"""
+        with self._lock:
+            since = max(self._last_id - REFRESH_LOOKBACK, 0)
+            with DB.connection() as conn:
+                cur = conn.cursor()
+                cur.execute(GET_REVOKED_TOKENS_SINCE, (since,))
+                rows = cur.fetchall()
+                cur.close()
+            for token_id, token in rows:
+                self._add(token)
+                self._last_id = max(self._last_id, token_id)
+            self._refreshed_at = time.monotonic()
+
+    def add(self, token):
+        """record a token revoked by this worker"""
+        with self._lock:
+            self._add(token)
+
+    def is_revoked(self, token):
+        """
+        Whether the token was revoked. Only a refresh, at most once per
+        refresh_interval, or an overflowing set touches the database.
+        """
+        if self._refreshed_at is None or \
+                time.monotonic() - self._refreshed_at >= self.refresh_interval:
+            self.refresh()
+        if token in self._tokens:
+            return True
+        if self._overflow:
+            return execute_query([CHECK_TOKEN_VALIDITY, (token,)], "one") is not None
+        return False
+
+    def _add(self, token):
+        if len(self._tokens) < self.max_size:
+            self._tokens.add(token)
+        else:
+            # tokens that do not fit are only known to the database
+            self._overflow = True
+
+
+REVOKED_TOKENS = RevokedTokens()
@@ -1,13 +1,17 @@
+import psycopg2
 from flask import request
 from flask_expects_json import expects_json
 from flask_jwt_extended import jwt_required
 from flask_restful import Resource
 from flasgger import swag_from
 
-from storemanager.api.v2.models.category import CategoryModel
+from storemanager.api.v2.models.category import CategoryModel, CATEGORY_CACHE
 from storemanager.api.v2.utils.validators import CustomValidator
 from storemanager.api.v2.utils.custom_checks import *
+from storemanager.api.v2.utils.etags import (
+    catalogue_etag, etag_header, not_modified)
 from storemanager.api.v2.utils.converters import date_to_string
+from storemanager.api.v2.utils.pagination import get_page_args
 
 CATEGORY_SCHEMA = {
     'type': 'object',
@@ -50,14 +54,24 @@ class Category(Resource):
         name = data.get('name')
         c_name = name.lower().strip()
         description = data.get('description')
-        result = CategoryModel.get_by_id(GET_CATEGORY, (category_id,))
+        result = CategoryModel.get_by_id(GET_CATEGORY, (category_id,),
+                                         cached=False)
         if result is None:
             return {'message': 'category with id does not exist'}, 404
 
         category = CategoryModel()
         category.id = result[0]
-        category.update(UPDATE_CATEGORY,
-                        (c_name, description, category.id))
+        taken = CategoryModel.get_by_name(GET_CATEGORY_BY_NAME, (c_name,),
+                                          cached=False)
+        if taken is not None and taken[0] != category.id:
+            return {'message': 'category already exists'}, 400
+        try:
+            category.update(UPDATE_CATEGORY,
+                            (c_name, description, category.id))
+        except psycopg2.IntegrityError:
+            # the name was taken by a concurrent write since the check
+            return {'message': 'category already exists'}, 409
+        CATEGORY_CACHE.invalidate()
         return {'message': 'category updated successfully'}, 200
 
     @jwt_required
@@ -66,13 +80,18 @@ class Category(Resource):
         check_user_admin()
         check_id_integer(category_id)
 
-        result = CategoryModel.get_by_id(GET_CATEGORY, (category_id,))
+        result = CategoryModel.get_by_id(GET_CATEGORY, (category_id,),
+                                         cached=False)
         if result is None:
             return {'message': 'category with id does not exist'}, 404
 
         category = CategoryModel()
         category.id = result[0]
-        category.delete(DELETE_CATEGORY, (category_id,))
+        try:
+            category.delete(DELETE_CATEGORY, (category_id,))
+        except psycopg2.IntegrityError:
+            return {'message': 'category has products'}, 409
+        CATEGORY_CACHE.invalidate()
         return {'message': 'category deleted successfully'}, 200
 
 
@@ -83,8 +102,14 @@ class Categories(Resource):
     @swag_from('docs/category_get_all.yml')
     def get(self):
         check_user_admin()
+        after_id, limit = get_page_args()
+        etag = catalogue_etag('categories')
+        response = not_modified(etag)
+        if response is not None:
+            return response
         categories = []
-        result = CategoryModel.get_all(GET_ALL_CATEGORIES)
+        result, next_id = CategoryModel.get_page(
+            GET_CATEGORIES_PAGE, after_id, limit)
 
         for i in range(len(result)):
             category = CategoryModel()
@@ -93,9 +118,10 @@ class Categories(Resource):
             category.description = result[i][2]
             category.created = date_to_string(result[i][3])
             categories.append(category.as_dict())
-        if not categories:
+        if not categories and after_id == 0:
             return {'message': 'no categories added yet'}, 404
-        return {'categories': categories}, 200
+        return {'categories': categories, 'next': next_id}, 200, \
+            etag_header(etag)
 
     @jwt_required
     @expects_json(CATEGORY_SCHEMA)
@@ -110,11 +136,12 @@ class Categories(Resource):
         CustomValidator.validate_category_details(c_name, description)
 
         category = CategoryModel.get_by_name(
-            GET_CATEGORY_BY_NAME, (c_name,))
+            GET_CATEGORY_BY_NAME, (c_name,), cached=False)
         if category is not None:
             abort(400, 'category already exists')
         category = CategoryModel()
         result = category.save(CREATE_CATEGORY, (c_name, description))
+        CATEGORY_CACHE.invalidate()
 
         category.id = result[0]
         category.name = result[1]
@@ -1,14 +1,25 @@
-from flask import request
+import csv
+import io
+import re
+
+import psycopg2
+from flask import request, abort, current_app
 from flask_expects_json import expects_json
 from flask_jwt_extended import jwt_required
 from flask_restful import Resource
 from flasgger import swag_from
+from psycopg2.errorcodes import FOREIGN_KEY_VIOLATION, UNIQUE_VIOLATION
+from werkzeug.exceptions import HTTPException
 
 from storemanager.api.v2.models.product import ProductModel
-from storemanager.api.v2.models.category import CategoryModel
+from storemanager.api.v2.models.category import CATEGORY_CACHE
+from storemanager.api.v2.models.product_import import (
+    get_category_ids, import_products)
 from storemanager.api.v2.utils.validators import CustomValidator
 from storemanager.api.v2.utils.custom_checks import *
-from storemanager.api.v2.utils.converters import date_to_string
+from storemanager.api.v2.utils.etags import (
+    catalogue_etag, etag_header, not_modified)
+from storemanager.api.v2.utils.pagination import get_page_args
 
 PRODUCT_SCHEMA = {
     'type': 'object',
@@ -25,6 +36,71 @@ PRODUCT_SCHEMA = {
                  'category', 'stock', 'min_stock']
 }
 
+IMPORT_FIELDS = PRODUCT_SCHEMA['required']
+
+# integers as CSV files spell them, str.isdigit also accepts digits
+# such as superscripts that int() rejects
+INTEGER_TEXT = re.compile(r'-?[0-9]+')
+
+# range of the INTEGER columns the imported numbers are stored in
+INTEGER_MIN = -2 ** 31
+INTEGER_MAX = 2 ** 31 - 1
+
+
+def read_import_records():
+    """the records of a product import, sent as a JSON array or a CSV file"""
+    if request.mimetype == 'text/csv':
+        reader = csv.DictReader(io.StringIO(request.get_data(as_text=True)))
+        records = list(reader)
+    else:
+        records = request.get_json(silent=True)
+        if not isinstance(records, list):
+            abort(400, 'expected a JSON array or a CSV file of products')
+
+    max_rows = current_app.config['IMPORT_MAX_ROWS']
+    if len(records) > max_rows:
+        abort(400, 'an import is limited to {} products'.format(max_rows))
+    return records
+
+
+def import_integer(record, field):
+    """an integer field of a record, CSV files provide them as text"""
+    value = record[field]
+    if isinstance(value, str) and INTEGER_TEXT.fullmatch(value.strip()):
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int):
+        abort(400, '{} should be an integer'.format(field))
+    if not INTEGER_MIN <= value <= INTEGER_MAX:
+        abort(400, '{} is out of range'.format(field))
+    return value
+
+
+def parse_import_record(record):
+    """
+    Validates a record the way a single product is validated, returns
+    its (name, price, stock, min_stock, description, category)
+    """
+    if not isinstance(record, dict):
+        abort(400, 'product should be an object')
+    for field in IMPORT_FIELDS:
+        if record.get(field) is None:
+            abort(400, '{} is required'.format(field))
+        if field in ('name', 'description', 'category') and \
+                not isinstance(record[field], str):
+            abort(400, '{} should be a string'.format(field))
+
+    name = record['name'].lower().strip()
+    category = record['category'].lower().strip()
+    description = record['description']
+    price = import_integer(record, 'price')
+    stock = import_integer(record, 'stock')
+    min_stock = import_integer(record, 'min_stock')
+    CustomValidator.validate_product_details(
+        name, price, description, category, stock, min_stock)
+    if len(name) > 50:
+        abort(400, 'name should be at most 50 characters')
+    return name, price, stock, min_stock, description, category
+
 
 class Product(Resource):
     """Allows requests on a single product"""
@@ -34,24 +110,12 @@ class Product(Resource):
     def get(self, product_id):
         """get one product"""
         check_id_integer(product_id)
-        result = ProductModel.get_by_id(GET_PRODUCT, (product_id,))
+        result = ProductModel.get_by_id(
+            GET_PRODUCT_WITH_CATEGORY, (product_id,))
         if result is None:
             return {'message': 'product with id does not exist'}, 404
 
-        product = ProductModel()
-        product.id = result[0]
-        product.name = result[1]
-        product.price = result[2]
-        product.stock = result[3]
-        product.min_stock = result[4]
-        product.description = result[5]
-        product.created = date_to_string(result[6])
-
-        category_details = CategoryModel.get_by_id(
-            GET_CATEGORY, (result[7],))
-        category_name = category_details[1]
-        product.category = category_name
-
+        product = ProductModel.from_row(result)
         return {'product': product.as_dict()}, 200
 
     @jwt_required
@@ -76,21 +140,35 @@ class Product(Resource):
 
         p_name = name.lower().strip()
         p_cat = category.lower().strip()
-        category_details = CategoryModel.get_by_name(
-            GET_CATEGORY_BY_NAME, (p_cat,))
+        category_details = CATEGORY_CACHE.get_by_name(p_cat)
         if category_details is None:
             return {'message': 'category provided does not exist'}, 404
         category_id = category_details[0]
 
-        result = ProductModel.get_by_id(GET_PRODUCT, (product_id,))
+        result = ProductModel.get_by_id(GET_PRODUCT, (product_id,),
+                                        cached=False)
         if result is None:
             return {'message': 'product with id does not exist'}, 404
 
         product = ProductModel()
         product.id = result[0]
+        taken = ProductModel.get_by_name(GET_PRODUCT_BY_NAME, (p_name,),
+                                         cached=False)
+        if taken is not None and taken[0] != product.id:
+            return {'message': 'product already exists'}, 400
         values = (p_name, description, price, stock,
                   min_stock, category_id, product.id)
-        product.update(UPDATE_PRODUCT, values)
+        try:
+            product.update(UPDATE_PRODUCT, values)
+        except psycopg2.IntegrityError as error:
+            # the name was taken by a concurrent write since the check
+            if error.pgcode == UNIQUE_VIOLATION:
+                return {'message': 'product already exists'}, 409
+            # the cached category was deleted by another worker
+            if error.pgcode != FOREIGN_KEY_VIOLATION:
+                raise
+            CATEGORY_CACHE.expire()
+            return {'message': 'category provided does not exist'}, 404
         return {'message': 'product updated successfully'}, 200
 
     @jwt_required
@@ -99,7 +177,8 @@ class Product(Resource):
         """delete a product"""
         check_user_admin()
         check_id_integer(product_id)
-        result = ProductModel.get_by_id(GET_PRODUCT, (product_id,))
+        result = ProductModel.get_by_id(GET_PRODUCT, (product_id,),
+                                        cached=False)
         if result is None:
             return {'message': 'product with id does not exist'}, 404
 
@@ -115,28 +194,23 @@ class ProductList(Resource):
     @jwt_required
     @swag_from('docs/product_get_all.yml')
     def get(self):
-        """get all products"""
+        """get a page of products"""
+        after_id, limit = get_page_args()
+        etag = catalogue_etag('products', 'categories')
+        response = not_modified(etag)
+        if response is not None:
+            return response
         products = []
-        result = ProductModel.get_all(GET_ALL_PRODUCTS)
+        result, next_id = ProductModel.get_page(
+            GET_PRODUCTS_PAGE, after_id, limit)
         for i in range(len(result)):
-            product = ProductModel()
-            product.id = result[i][0]
-            product.name = result[i][1]
-            product.price = result[i][2]
-            product.stock = result[i][3]
-            product.min_stock = result[i][4]
-            product.description = result[i][5]
-            product.created = date_to_string(result[i][6])
-            category_details = CategoryModel.get_by_id(
-                GET_CATEGORY, (result[i][7],))
-            category_name = category_details[1]
-
-            product.category = category_name
+            product = ProductModel.from_row(result[i])
             products.append(product.as_dict())
-        if not products:
+        if not products and after_id == 0:
             return {'message': 'no products added yet'}, 404
 
-        return {'products': products}, 200
+        return {'products': products, 'next': next_id}, 200, \
+            etag_header(etag)
 
     @jwt_required
     @expects_json(PRODUCT_SCHEMA)
@@ -161,11 +235,10 @@ class ProductList(Resource):
         )
 
         product = ProductModel.get_by_name(
-            GET_PRODUCT_BY_NAME, (p_name,))
+            GET_PRODUCT_BY_NAME, (p_name,), cached=False)
         if product is not None:
             return {'message': 'product already exists'}, 400
-        category_result = CategoryModel.get_by_name(
-            GET_CATEGORY_BY_NAME, (p_cat,))
+        category_result = CATEGORY_CACHE.get_by_name(p_cat)
         if category_result is None:
             return {'message': 'category provided does not exist'}, 400
 
@@ -175,20 +248,62 @@ class ProductList(Resource):
                           product_stock, product_min_stock,
                           product_description, category_id)
 
-        product = ProductModel()
-        result = product.save(CREATE_PRODUCT, product_values)
-        product.id = result[0]
-        product.name = result[1]
-        product.description = result[2]
-        product.price = result[3]
-        product.stock = result[4]
-        product.min_stock = result[5]
-        product.created = date_to_string(result[6])
-
-        category_details = CategoryModel.get_by_id(
-            GET_CATEGORY, (result[7],))
-        category_name = category_details[1]
-        product.category = category_name
+        try:
+            result = ProductModel().save(CREATE_PRODUCT, product_values)
+        except psycopg2.IntegrityError as error:
+            if error.pgcode != FOREIGN_KEY_VIOLATION:
+                raise
+            CATEGORY_CACHE.expire()
+            return {'message': 'category provided does not exist'}, 400
+        product = ProductModel.from_row(result)
 
         return {'message': 'product created',
                 'product': product.as_dict()}, 201
+
+
+class ProductImport(Resource):
+    """Allows adding many products in one request"""
+
+    @jwt_required
+    @swag_from('docs/product_import.yml')
+    def post(self):
+        """add the products of a JSON array or a CSV file"""
+        check_user_admin()
+        records = read_import_records()
+
+        errors = []
+        parsed = {}
+        for line, record in enumerate(records, 1):
+            try:
+                product = parse_import_record(record)
+            except HTTPException as error:
+                errors.append({'row': line, 'message': error.description})
+                continue
+            if product[0] in parsed:
+                errors.append({'row': line,
+                               'message': 'product already exists'})
+                continue
+            parsed[product[0]] = (line,) + product
+
+        category_ids = get_category_ids(
+            {product[6] for product in parsed.values()})
+        rows = []
+        for product in parsed.values():
+            if product[6] not in category_ids:
+                errors.append({'row': product[0],
+                               'message': 'category provided does not exist'})
+                continue
+            rows.append(product[:6] + (category_ids[product[6]],))
+
+        added = import_products(rows) if rows else set()
+        for row in rows:
+            if row[1] not in added:
+                errors.append({'row': row[0],
+                               'message': 'product already exists'})
+        errors.sort(key=lambda error: error['row'])
+
+        if not added:
+            return {'message': 'no products imported', 'imported': 0,
+                    'errors': errors}, 400
+        return {'message': 'products imported', 'imported': len(added),
+                'errors': errors}, 201
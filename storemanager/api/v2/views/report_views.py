@@ -0,0 +1,33 @@
+from flask_jwt_extended import jwt_required
+from flask_restful import Resource
+from flasgger import swag_from
+
+from storemanager.api.v2.models.sales_report import SalesReportModel
+from storemanager.api.v2.utils.custom_checks import check_user_admin
+from storemanager.api.v2.utils.reports import get_report_args
+
+
+class SalesReport(Resource):
+    """Allows admins to see sales totals over a range of days"""
+
+    @jwt_required
+    @swag_from('docs/report_sales.yml')
+    def get(self):
+        """get the sales totals grouped by day, week, attendant or product"""
+        check_user_admin()
+        start, end, group_by = get_report_args(SalesReportModel.GROUPS)
+        result = SalesReportModel.get_report(group_by, start, end)
+
+        report = []
+        for i in range(len(result)):
+            entry = SalesReportModel()
+            entry.group_by = group_by
+            entry.group = result[i][0]
+            entry.quantity = result[i][1]
+            entry.revenue = result[i][2]
+            report.append(entry.as_dict())
+
+        return {'from': start.isoformat(),
+                'to': end.isoformat(),
+                'group_by': group_by,
+                'report': report}, 200
@@ -1,16 +1,20 @@
-from flask import request
+import json
+
+from flask import request, current_app, Response
 from flask_expects_json import expects_json
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from flask_restful import Resource
 from flasgger import swag_from
+from werkzeug.exceptions import HTTPException
 
+from storemanager.api.v2.database.database import DB
 from storemanager.api.v2.database.queries import *
-from storemanager.api.v2.models.product import ProductModel
+from storemanager.api.v2.models.checkout import create_sale, create_sales, CheckoutError
 from storemanager.api.v2.models.sale_record import *
-from storemanager.api.v2.models.user import UserModel
 from storemanager.api.v2.utils.validators import CustomValidator
-from storemanager.api.v2.utils.custom_checks import check_id_integer
+from storemanager.api.v2.utils.custom_checks import check_id_integer, check_user_admin, get_user_claims
 from storemanager.api.v2.utils.converters import date_to_string
+from storemanager.api.v2.utils.pagination import get_page_args
 
 SALES_SCHEMA = {
     "type": "object",
@@ -32,6 +36,34 @@ SALES_SCHEMA = {
     ]
 }
 
+SALES_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sales": {
+            "type": "array",
+            "items": SALES_SCHEMA
+        }
+    },
+    "required": [
+        "sales"
+    ]
+}
+
+
+def cart_from_items(items):
+    """validated (product name, quantity) pairs of a sale's products"""
+    cart = []
+    for i in range(len(items)):
+        product_name = items[i]['name']
+        quantity_in_cart = items[i]['count']
+
+        p_name = product_name.lower().strip()
+
+        CustomValidator.validate_sale_items(
+            p_name, quantity_in_cart)
+        cart.append((p_name, quantity_in_cart))
+    return cart
+
 
 class SaleRecord(Resource):
     """Allows requests on a single sale"""
@@ -70,113 +102,147 @@ class SaleRecord(Resource):
                 'date_created': sale.created}, 200
 
 
+def sales_as_json_lines(rows):
+    """Convert sale record rows to newline delimited json"""
+    for row in rows:
+        sale = SaleRecordModel()
+        sale.id = row[0]
+        sale.items = row[1]
+        sale.total = row[2]
+        sale.attendant = row[3]
+        sale.created = date_to_string(row[4])
+        yield json.dumps(sale.as_dict()) + '\n'
+
+
+class SaleRecordsExport(Resource):
+    """Allows all sales to be downloaded at once"""
+
+    @jwt_required
+    @swag_from('docs/sale_export.yml')
+    def get(self):
+        """stream every sale record as newline delimited json"""
+        check_user_admin()
+        rows = DB.stream(GET_ALL_SALES,
+                         itersize=current_app.config['EXPORT_ITERSIZE'])
+        return Response(sales_as_json_lines(rows),
+                        mimetype='application/x-ndjson')
+
+
+def sales_page(statement, values=()):
+    """
+    Response with a page of the sale records of statement, a keyset
+    page query filtered by values
+    """
+    after_id, limit = get_page_args()
+    sales = []
+    result, next_id = SaleRecordModel.get_page(
+        statement, after_id, limit, values)
+
+    for i in range(len(result)):
+        sale = SaleRecordModel()
+        sale.id = result[i][0]
+        sale.items = result[i][1]
+        sale.total = result[i][2]
+        sale.attendant = result[i][3]
+        sale.created = date_to_string(result[i][4])
+        sales.append(sale.as_dict())
+    if not sales and after_id == 0:
+        return {'message': 'no sales added yet'}, 404
+
+    return {'sales': sales, 'next': next_id}, 200
+
+
+class SaleRecordsMine(Resource):
+    """Allows attendants to list the sales they made"""
+
+    @jwt_required
+    @swag_from('docs/sale_get_mine.yml')
+    def get(self):
+        """get a page of the current user's sale records"""
+        attendant_id, _ = get_user_claims()
+        return sales_page(GET_SALES_PAGE_BY_ATTENDANT, (attendant_id,))
+
+
 class SaleRecords(Resource):
     """Allows requests on sales"""
 
     @jwt_required
     @swag_from('docs/sale_get_all.yml')
     def get(self):
-        """get all sale records"""
-        sales = []
-        result = SaleRecordModel.get_all(GET_ALL_SALES)
-
-        for i in range(len(result)):
-            sale = SaleRecordModel()
-            sale.id = result[i][0]
-            sale.items = result[i][1]
-            sale.total = result[i][2]
-            sale.attendant = result[i][3]
-            sale.created = date_to_string(result[i][4])
-            sales.append(sale.as_dict())
-        if not sales:
-            return {'message': 'no sales added yet'}, 404
-
-        return {'sales': sales}, 200
+        """get a page of sale records, of one attendant if given"""
+        attendant_id = request.args.get('attendant_id')
+        if attendant_id is None:
+            return sales_page(GET_SALES_PAGE)
+        if not attendant_id.isdigit():
+            return {'message': 'attendant_id should be a positive integer'}, 400
+        return sales_page(GET_SALES_PAGE_BY_ATTENDANT, (int(attendant_id),))
 
     @jwt_required
     @expects_json(SALES_SCHEMA)
     @swag_from('docs/sale_post.yml')
     def post(self):
         """create a new sale"""
-        current_user = get_jwt_identity()
-        user_details = UserModel.get_by_name(GET_USER_BY_NAME, (current_user,))
-        if user_details[3] != "attendant":
+        attendant_id, role = get_user_claims()
+        if role != "attendant":
             return {'message': 'only attendants can create a sale record'}, 403
         data = request.get_json()
-        total_cost = 0
-        items_count = 0
-        products = []
-        items = data['products']
-
-        for i in range(len(items)):
-            product_name = items[i]['name']
-            quantity_in_cart = items[i]['count']
-
-            p_name = product_name.lower().strip()
-
-            CustomValidator.validate_sale_items(
-                p_name, quantity_in_cart)
-
-            product = ProductModel.get_by_name(
-                GET_PRODUCT_BY_NAME, (p_name,))
-            if product is None:
-                return {'message': 'failed to create sale record',
-                        'reason': 'product named {} does '
-                                  'not exist'.format(p_name)}, 400
-
-            # product_price = product[2]
-            # cost = product_price * quantity_in_cart
-            if product[3] - quantity_in_cart < 0:
-                return {'message': 'failed to create sale record',
-                        'reason': 'cannot sell past minimum '
-                                  'stock for {}'.format(p_name)}, 400
-
-        for i in range(len(items)):
-            product_name = items[i]['name']
-            quantity_in_cart = items[i]['count']
-
-            p_name = product_name.lower().strip()
-
-            CustomValidator.validate_sale_items(
-                p_name, quantity_in_cart)
-
-            product = ProductModel.get_by_name(
-                GET_PRODUCT_BY_NAME, (p_name,))
+        cart = cart_from_items(data['products'])
 
-            product_price = product[2]
-            cost = product_price * quantity_in_cart
-
-            new_stock_value = product[3] - quantity_in_cart
-            ProductModel.update_on_sale(
-                UPDATE_PRODUCT_ON_SALE, (new_stock_value, product[0]))
-
-            product_info = (p_name,
-                            product_price,
-                            quantity_in_cart,
-                            cost)
-
-            products.append(product_info)
-
-            total_cost += cost
-            items_count += quantity_in_cart
-
-        attendant_id = user_details[0]
+        try:
+            result = create_sale(cart, attendant_id)
+        except CheckoutError as error:
+            return {'message': 'failed to create sale record',
+                    'reason': str(error)}, 400
 
         sale = SaleRecordModel()
-        sale.items = items_count
-        sale.total = total_cost
-        sale.attendant = attendant_id
-        result = sale.save(CREATE_SALE, (items_count, total_cost, attendant_id))
         sale.id = result[0]
+        sale.items = result[1]
+        sale.total = result[2]
+        sale.attendant = result[3]
         sale.created = date_to_string(result[4])
-
-        products_in_sale = []
-        for i in range(len(products)):
-            product = products[i]
-            sale_item = product + (sale.id,)
-            tuple(product)
-            products_in_sale.append(sale_item)
-        sale_items = SaleRecordModelItem()
-        sale_items.save(CREATE_SALE_ITEM, products_in_sale)
         return {'message': 'Sale Record created successfully',
                 'sale': sale.as_dict()}, 201
+
+
+class SaleRecordsBatch(Resource):
+    """Allows tills to send the sales they made offline in one request"""
+
+    @jwt_required
+    @expects_json(SALES_BATCH_SCHEMA)
+    @swag_from('docs/sale_batch.yml')
+    def post(self):
+        """create many sales in one transaction"""
+        attendant_id, role = get_user_claims()
+        if role != "attendant":
+            return {'message': 'only attendants can create a sale record'}, 403
+        sales = request.get_json()['sales']
+        max_sales = current_app.config['SALES_BATCH_MAX']
+        if len(sales) > max_sales:
+            return {'message': 'a batch is limited to {} sales'.format(
+                max_sales)}, 400
+
+        results = [None] * len(sales)
+        carts = []
+        for position, sale in enumerate(sales):
+            try:
+                carts.append((position, cart_from_items(sale['products'])))
+            except HTTPException as error:
+                results[position] = {'reason': error.description}
+
+        try:
+            created = create_sales([cart for _, cart in carts], attendant_id)
+        except CheckoutError as error:
+            return {'message': 'failed to create sale records',
+                    'reason': str(error)}, 400
+        for (position, _), result in zip(carts, created):
+            if isinstance(result, CheckoutError):
+                results[position] = {'reason': str(result)}
+            else:
+                results[position] = {'id': result[0]}
+
+        count = sum(1 for result in results if 'id' in result)
+        if not count:
+            return {'message': 'failed to create sale records',
+                    'created': 0, 'sales': results}, 400
+        return {'message': 'Sale Records created successfully',
+                'created': count, 'sales': results}, 201
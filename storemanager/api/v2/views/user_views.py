@@ -1,3 +1,4 @@
+import psycopg2
 from flask import request, abort
 from flask_expects_json import expects_json
 from flask_jwt_extended import jwt_required, create_access_token, get_raw_jwt
@@ -6,7 +7,9 @@ from flasgger import swag_from
 
 from storemanager.api.v2.utils.validators import CustomValidator
 from storemanager.api.v2.utils.custom_checks import *
-from storemanager.api.v2.database.database import execute_query
+from storemanager.api.v2.utils.pagination import get_page_args
+from storemanager.api.v2.utils.revoked_tokens import REVOKED_TOKENS
+from storemanager.api.v2.database.database import DB, execute_query
 
 
 USER_SCHEMA = {
@@ -48,7 +51,10 @@ class User(Resource):
         result = UserModel.get_by_id(GET_USER, (user_id,))
         if result is not None:
             user = UserModel()
-            user.delete(DELETE_USER, (user_id,))
+            try:
+                user.delete(DELETE_USER, (user_id,))
+            except psycopg2.IntegrityError:
+                return {'message': 'user has sales'}, 409
             return {'message': 'user deleted successfully'}, 200
 
         return {'message': 'user with id does not exist'}, 404
@@ -62,8 +68,9 @@ class UserList(Resource):
     def get(self):
         """get all users"""
         check_user_admin()
+        after_id, limit = get_page_args()
         users = []
-        result = UserModel.get_all(GET_ALL_USERS)
+        result, next_id = UserModel.get_page(GET_USERS_PAGE, after_id, limit)
 
         for i in range(len(result)):
             user = UserModel()
@@ -71,10 +78,10 @@ class UserList(Resource):
             user.username = result[i][1]
             user.role = result[i][2]
             users.append(user.as_dict())
-        if not users:
+        if not users and after_id == 0:
             return {'message': 'no users in system yet'}, 404
 
-        return {'users': users}, 200
+        return {'users': users, 'next': next_id}, 200
 
     @expects_json(USER_SCHEMA)
     @jwt_required
@@ -150,7 +157,9 @@ class UserLogin(Resource):
             return {'message': 'user does not exist'}, 404
 
         if user_result[1] == uname and user_result[2] == password:
-            access_token = create_access_token(identity=uname, expires_delta=False)
+            claims = {'id': user_result[0], 'role': user_result[3]}
+            access_token = create_access_token(identity=uname, expires_delta=False,
+                                               user_claims=claims)
             return {'message': 'login successful',
                     'user_role': user_result[3],
                     'access_token': access_token}, 200
@@ -169,4 +178,7 @@ class UserLogout(Resource):
         """logout a user"""
         token = get_raw_jwt()['jti']
         execute_query([REVOKE_TOKEN, (token,)], "one")
+        # only once the revocation is committed, so a rolled back logout
+        # does not leave the token revoked in this worker alone
+        DB.after_commit(lambda: REVOKED_TOKENS.add(token))
         return {"message": "logout successful"}, 200
@@ -1,7 +1,8 @@
 import json
 import pytest
 from storemanager import create_app
-from storemanager.api.v2.database.database import DB
+from storemanager.api.v2.database.database import DB, execute_query
+from storemanager.api.v2.database.queries import CREATE_USER, GET_USER_BY_NAME
 from tests.v2.sample_data import *
 
 
@@ -45,6 +46,11 @@ def authorize_admin(client):
     username = user['username']
     password = user['password']
 
+    # only the first admin can register, which is the user of test_auth
+    # when the whole suite runs, so add this admin directly in that case
+    if execute_query([GET_USER_BY_NAME, (username,)], "one") is None:
+        execute_query([CREATE_USER, (username, password, 'admin')], "one")
+
     credentials = {
         'username': username,
         'password': password
@@ -0,0 +1,60 @@
+"""
+Module containing tests for the app factory.
+"""
+from storemanager import create_app
+
+
+def test_api_docs_served(client):
+    """the spec should be built on request and cover every endpoint"""
+    response = client.get('/apispec_1.json')
+
+    assert response.status_code == 200
+    assert '/api/v2/products/import' in response.json['paths']
+
+
+def test_api_docs_disabled_in_production(client):
+    """production should not serve the API docs unless enabled"""
+    app = create_app('production')
+
+    assert not app.config['SWAGGER_ENABLED']
+    assert app.test_client().get('/apidocs/').status_code == 404
+
+
+def test_sql_timing_headers(client):
+    """responses should report the request's queries and their time"""
+    credentials = {'username': 'nobody', 'password': 'nobody'}
+    response = client.post('/auth/login', json=credentials)
+
+    assert int(response.headers['X-DB-Queries']) > 0
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+    assert 'db-acquire;dur=' in response.headers['Server-Timing']
+
+
+def test_sql_timing_headers_disabled_in_production(client):
+    """production should not expose the query timings"""
+    app = create_app('production')
+    response = app.test_client().get('/api/v2/products')
+
+    assert 'X-DB-Queries' not in response.headers
+    assert 'Server-Timing' not in response.headers
+
+
+def test_metrics_exported(client):
+    """requests should be counted per resource and status code"""
+    client.get('/api/v2/products')
+    response = client.get('/metrics')
+    metrics = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert ('storemanager_requests_total{method="GET",resource="ProductList",'
+            'status="401"}') in metrics
+    assert 'storemanager_request_seconds_bucket' in metrics
+    assert 'storemanager_db_pool_connections{state="in_use"}' in metrics
+
+
+def test_metrics_disabled_in_production(client):
+    """production should not serve the unauthenticated metrics unless enabled"""
+    app = create_app('production')
+
+    assert not app.config['METRICS_ENABLED']
+    assert app.test_client().get('/metrics').status_code == 404
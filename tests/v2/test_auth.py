@@ -1,5 +1,6 @@
 import json
 import pytest
+from flask_jwt_extended import decode_token
 
 from run import app
 from tests.v2.sample_data import USERS, HEADERS
@@ -39,6 +40,19 @@ def test_user_login(auth_client):
     assert response.status_code == 200
 
 
+def test_user_login_token_claims(auth_client):
+    """ Test that the access token carries the user id and role."""
+    credentials = {
+        'username': USERS['user3']['username'],
+        'password': USERS['user3']['password']
+    }
+
+    response = auth_client.post('auth/login', data=json.dumps(credentials), headers=HEADERS)
+    claims = decode_token(response.json['access_token'])['user_claims']
+
+    assert claims == {'id': 1, 'role': 'admin'}
+
+
 def test_already_registered_user(auth_client):
     """ Test registered user who wants to register again"""
     response = auth_client.post('/auth/register', data=json.dumps(USERS['user3']), headers=HEADERS)
@@ -0,0 +1,68 @@
+"""
+Module containing tests for the model caches.
+"""
+import time
+
+from storemanager.api.v2.models.cache import MemoryCache, ModelCaches, MISSING
+
+
+class CachedModel:
+    cache_ttl = 10
+    cache_size = 2
+
+
+class UncachedModel:
+    cache_ttl = None
+    cache_size = 2
+
+
+def test_memory_cache_hit_and_miss():
+    """cached values, None included, should be returned and counted"""
+    cache = MemoryCache(max_size=2, ttl=10)
+    assert cache.get('a') is MISSING
+    cache.set('a', None)
+
+    assert cache.get('a') is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_memory_cache_evicts_least_recently_used():
+    """the least recently used entry should be evicted when full"""
+    cache = MemoryCache(max_size=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+
+def test_memory_cache_expires_entries():
+    """entries should not be returned after their ttl"""
+    cache = MemoryCache(max_size=2, ttl=10)
+    cache.set('a', 1, ttl=0.01)
+    time.sleep(0.02)
+
+    assert cache.get('a') is MISSING
+    assert cache.stats()['size'] == 0
+
+
+def test_model_caches_per_model():
+    """each model with a ttl should get its own cache"""
+    caches = ModelCaches()
+
+    assert caches.get(UncachedModel) is None
+    assert caches.get(CachedModel) is caches.get(CachedModel)
+    assert caches.get(CachedModel).max_size == 2
+    assert list(caches.stats()) == ['CachedModel']
+
+
+def test_model_caches_disabled():
+    """no model should be cached once caching is switched off"""
+    caches = ModelCaches()
+    caches.configure(enabled=False)
+
+    assert caches.get(CachedModel) is None
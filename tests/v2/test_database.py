@@ -0,0 +1,158 @@
+"""
+Module containing tests for the database helpers.
+"""
+import threading
+
+import psycopg2
+import pytest
+
+from storemanager.api.v2.database.database import (
+    DB, execute_query, execute_values_returning)
+from storemanager.api.v2.database.instrumentation import QUERY_STATS
+from storemanager.api.v2.database.migrations import (
+    LATEST_VERSION, current_version, migrate)
+from storemanager.api.v2.database.queries import (
+    CHECK_NAMES_UNIQUE, DECREMENT_PRODUCT_STOCK, GET_ALL_CATEGORIES,
+    GET_USER_BY_NAME)
+
+
+def temp_table_exists():
+    """check for the temporary table created by the rollback test"""
+    with DB.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT to_regclass('pg_temp.unit_of_work_check')")
+        return cur.fetchone()[0] is not None
+
+
+def test_request_shares_connection(client):
+    """every query within one request should use the same connection"""
+    with client.application.test_request_context():
+        with DB.connection() as first:
+            pass
+        with DB.connection() as second:
+            pass
+        DB.end_request()
+
+    assert first is second
+
+
+def test_request_rolled_back_on_error(client):
+    """work done by a request that failed should not be committed"""
+    with client.application.test_request_context():
+        with DB.connection() as conn:
+            conn.cursor().execute(
+                "CREATE TEMP TABLE unit_of_work_check (id INTEGER)")
+        assert temp_table_exists()
+        DB.end_request(Exception('request failed'))
+
+    with client.application.test_request_context():
+        exists = temp_table_exists()
+        DB.end_request()
+
+    assert not exists
+
+
+def test_execute_query_raises_errors(client):
+    """a failed query should raise instead of returning an earlier result"""
+    assert execute_query(["SELECT %s", (1,)], "one") == (1,)
+
+    with pytest.raises(psycopg2.Error):
+        execute_query(["SELECT missing_column FROM users"], "one")
+    with pytest.raises(ValueError):
+        execute_query(["SELECT 1"], "first")
+
+
+def test_execute_query_concurrent(client):
+    """threads hammering execute_query should only see their own results"""
+    errors = []
+
+    def worker(number):
+        try:
+            for i in range(50):
+                value = number * 1000 + i
+                if execute_query(["SELECT %s", (value,)], "one") != (value,):
+                    errors.append('wrong row for {}'.format(value))
+                rows = execute_query(
+                    ["SELECT generate_series(1, %s)", (number,)], "many")
+                if len(rows) != number:
+                    errors.append('wrong rows for {}'.format(number))
+                try:
+                    execute_query(["SELECT 1 / (%s - %s)", (i, i)], "one")
+                    errors.append('no error for {}'.format(value))
+                except psycopg2.DataError:
+                    pass
+        except Exception as error:
+            errors.append(repr(error))
+
+    threads = [threading.Thread(target=worker, args=(number,))
+               for number in range(1, 21)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+
+
+def test_hot_queries_prepared_once(client):
+    """registered statements should be prepared once per connection"""
+    with client.application.test_request_context():
+        first = execute_query([GET_USER_BY_NAME, ('nobody',)], "one")
+        second = execute_query([GET_USER_BY_NAME, ('nobody',)], "one")
+        with DB.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT name FROM pg_prepared_statements")
+            names = [row[0] for row in cur.fetchall()]
+        DB.end_request()
+
+    assert first is None and second is None
+    assert names.count('get_user_by_name') == 1
+    assert 'get_user_by_name' in conn.prepared
+
+
+def test_slow_queries_logged(client, caplog):
+    """statements over the threshold should be logged by their name"""
+    with client.application.test_request_context():
+        QUERY_STATS.configure(0)
+        try:
+            execute_query([GET_ALL_CATEGORIES], "many_no_values")
+            execute_query([GET_USER_BY_NAME, ('nobody',)], "one")
+            with DB.connection() as conn:
+                execute_values_returning(conn.cursor(),
+                                         DECREMENT_PRODUCT_STOCK, [(0, 1)])
+            count, query_time, _ = QUERY_STATS.request_stats()
+        finally:
+            QUERY_STATS.configure(client.application.config['SLOW_QUERY_MS'])
+        DB.end_request()
+
+    assert count >= 2 and query_time > 0
+    assert 'slow query GET_ALL_CATEGORIES' in caplog.text
+    assert 'slow query GET_USER_BY_NAME' in caplog.text
+    assert 'slow query DECREMENT_PRODUCT_STOCK' in caplog.text
+
+
+def test_migrations_applied_once(client):
+    """an up to date database should not be migrated again"""
+    assert current_version() == LATEST_VERSION
+    assert migrate() == []
+
+    result = client.application.test_cli_runner().invoke(args=['migrate'])
+    assert 'database schema is at version {}'.format(
+        LATEST_VERSION) in result.output
+
+
+def test_duplicate_names_stop_migration(client):
+    """duplicate names should be reported rather than renamed"""
+    with client.application.test_request_context():
+        with pytest.raises(psycopg2.InternalError) as error:
+            with DB.connection() as conn:
+                cur = conn.cursor()
+                # shadows the categories table for this transaction only
+                cur.execute("CREATE TEMP TABLE categories (id SERIAL, "
+                            "name VARCHAR(50)) ON COMMIT DROP")
+                cur.execute("INSERT INTO categories (name) "
+                            "VALUES ('twin'), ('single'), ('twin')")
+                cur.execute(CHECK_NAMES_UNIQUE)
+        DB.end_request()
+
+    assert "duplicate names: categories 'twin' (ids 1, 3)" in str(error.value)
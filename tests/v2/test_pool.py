@@ -0,0 +1,93 @@
+"""
+Module containing tests for the database connection pool.
+Uses stand in connections so no database server is needed.
+"""
+import pytest
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from storemanager.api.v2.database.pool import ConnectionPool
+
+
+class FakeConnection:
+    """Minimal stand in for a psycopg2 connection"""
+
+    def __init__(self):
+        self.closed = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+def test_pool_reuses_connections():
+    """returned connections should be handed out again"""
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=2)
+    conn = pool.getconn()
+    pool.putconn(conn)
+
+    assert pool.getconn() is conn
+    assert pool.stats()['size'] == 1
+
+
+def test_pool_fill_opens_min_size():
+    """fill should open min_size idle connections"""
+    pool = ConnectionPool(FakeConnection, min_size=3, max_size=5)
+    pool.fill()
+
+    assert pool.stats() == {'size': 3, 'idle': 3, 'in_use': 0, 'max_size': 5}
+
+
+def test_pool_recycles_after_max_uses():
+    """a connection should be closed once it has been used max_uses times"""
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1, max_uses=2)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    pool.putconn(conn)
+
+    assert conn.closed
+    assert pool.getconn() is not conn
+
+
+def test_pool_rolls_back_open_transactions():
+    """connections returned mid transaction should be rolled back"""
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1)
+    conn = pool.getconn()
+    conn.status = extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(conn)
+
+    assert conn.status == extensions.TRANSACTION_STATUS_IDLE
+    assert pool.getconn() is conn
+
+
+def test_pool_discards_closed_connections():
+    """closed connections should not be handed out"""
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.closed = 1
+
+    assert pool.getconn() is not conn
+
+
+def test_pool_times_out_when_exhausted():
+    """checkout should fail once the pool is exhausted for timeout seconds"""
+    pool = ConnectionPool(FakeConnection, min_size=0, max_size=1, timeout=0.01)
+    pool.getconn()
+
+    with pytest.raises(PoolError):
+        pool.getconn()
+
+
+def test_pool_rejects_invalid_sizes():
+    """sizes outside 0 <= min <= max, max >= 1 should be refused"""
+    for min_size, max_size in ((-1, 2), (0, 0), (3, 2)):
+        with pytest.raises(ValueError):
+            ConnectionPool(FakeConnection, min_size=min_size, max_size=max_size)
@@ -4,6 +4,13 @@ Contains tests for both Admin User and Attendant.
 """
 import json
 from datetime import date
+from flask_jwt_extended import decode_token
+from storemanager.api.v2.database.database import DB, execute_query
+from storemanager.api.v2.database.queries import (
+    BUMP_TABLE_VERSION, CREATE_CATEGORY, GET_PRODUCT_BY_NAME, REVOKE_TOKEN)
+from storemanager.api.v2.models.category import CATEGORY_CACHE, CategoryModel
+from storemanager.api.v2.models.product import ProductModel
+from storemanager.api.v2.utils.revoked_tokens import REVOKED_TOKENS
 from storemanager.api.v2.utils.converters import date_to_string
 from tests.v2.sample_data import *
 
@@ -247,6 +254,57 @@ def test_admin_update_category(client, authorize_admin):
     assert data['message'] == expected_message
 
 
+def test_admin_update_category_name_taken(client, authorize_admin, monkeypatch):
+    """admin should not be able to rename a category to an existing name"""
+    headers = authorize_admin
+    renamed = {'name': 'Food', 'description': 'electronics renamed'}
+
+    response = client.put('/api/v2/categories/2', data=json.dumps(renamed),
+                          headers=headers)
+    data = response.json
+    assert response.status_code == 400
+    assert data['message'] == 'category already exists'
+
+    # the name taken between the check and the update
+    monkeypatch.setattr(CategoryModel, 'get_by_name',
+                        classmethod(lambda cls, *args, **kwargs: None))
+    response = client.put('/api/v2/categories/2', data=json.dumps(renamed),
+                          headers=headers)
+    assert response.status_code == 409
+    assert response.json['message'] == 'category already exists'
+
+
+def test_category_cache_invalidated(client, authorize_admin):
+    """the category cache should reflect updates and count its hits"""
+    headers = authorize_admin
+    category = CATEGORY_CACHE.get_by_id(2)
+    hits = CATEGORY_CACHE.stats()['hits']
+
+    assert CATEGORY_CACHE.get_by_name('electronics') == category
+    assert CATEGORY_CACHE.stats()['hits'] == hits + 1
+
+    updated = {'name': 'electronics', 'description': 'cached electronics'}
+    client.put('/api/v2/categories/2', data=json.dumps(updated), headers=headers)
+    assert CATEGORY_CACHE.get_by_id(2)[2] == 'cached electronics'
+
+    client.put('/api/v2/categories/2', data=json.dumps(UPDATED_CATEGORY), headers=headers)
+    assert CATEGORY_CACHE.get_by_id(2)[2] == UPDATED_CATEGORY['description']
+
+
+def test_categories_not_modified(client, authorize_admin):
+    """unchanged categories should be answered with 304 until updated"""
+    headers = authorize_admin
+    response = client.get('/api/v2/categories', headers=headers)
+    conditional = dict(headers, **{'If-None-Match': response.headers['ETag']})
+
+    response = client.get('/api/v2/categories', headers=conditional)
+    assert response.status_code == 304
+
+    client.put('/api/v2/categories/2', data=json.dumps(UPDATED_CATEGORY), headers=headers)
+    response = client.get('/api/v2/categories', headers=conditional)
+    assert response.status_code == 200
+
+
 def test_admin_delete_category(client, authorize_admin):
     """admin should be able to get all categories"""
     headers = authorize_admin
@@ -403,6 +461,35 @@ def test_admin_get_all_products(client, authorize_admin):
     assert len(products) == 4
 
 
+def test_admin_get_products_paginated(client, authorize_admin):
+    """admin should be able to page through products"""
+    headers = authorize_admin
+    response = client.get('/api/v2/products?limit=3', headers=headers)
+    data = response.json
+
+    assert response.status_code == 200
+    assert [product['id'] for product in data['products']] == [1, 2, 3]
+    assert data['next'] == 3
+
+    response = client.get('/api/v2/products?limit=3&after_id=3', headers=headers)
+    data = response.json
+
+    assert response.status_code == 200
+    assert [product['id'] for product in data['products']] == [4]
+    assert data['next'] is None
+
+
+def test_admin_get_products_invalid_limit(client, authorize_admin):
+    """admin should not be able to pass a non integer page size"""
+    headers = authorize_admin
+    expected_message = 'limit should be a positive integer'
+    response = client.get('/api/v2/products?limit=a', headers=headers)
+    data = response.json
+
+    assert response.status_code == 400
+    assert data['message'] == expected_message
+
+
 def test_admin_get_one_product(client, authorize_admin):
     """admin should be able to get a single product"""
     headers = authorize_admin
@@ -435,6 +522,59 @@ def test_admin_update_product(client, authorize_admin):
     assert data['message'] == expected_message
 
 
+def test_admin_update_product_name_taken(client, authorize_admin, monkeypatch):
+    """admin should not be able to rename a product to an existing name"""
+    headers = authorize_admin
+    renamed = dict(PRODUCTS['product15'], name='Phone')
+
+    response = client.put('/api/v2/products/{:d}'.format(3), data=json.dumps(renamed), headers=headers)
+    data = response.json
+    assert response.status_code == 400
+    assert data['message'] == 'product already exists'
+
+    # the name taken between the check and the update
+    monkeypatch.setattr(ProductModel, 'get_by_name',
+                        classmethod(lambda cls, *args, **kwargs: None))
+    response = client.put('/api/v2/products/{:d}'.format(3), data=json.dumps(renamed), headers=headers)
+    assert response.status_code == 409
+    assert response.json['message'] == 'product already exists'
+
+
+def test_products_not_modified(client, authorize_admin):
+    """unchanged products should be answered with 304 until updated"""
+    headers = authorize_admin
+    response = client.get('/api/v2/products', headers=headers)
+    etag = response.headers['ETag']
+    conditional = dict(headers, **{'If-None-Match': etag})
+
+    response = client.get('/api/v2/products', headers=conditional)
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+
+    response = client.get('/api/v2/products?limit=2', headers=conditional)
+    assert response.status_code == 200
+
+    client.put('/api/v2/products/{:d}'.format(3), data=json.dumps(PRODUCTS['product15']), headers=headers)
+    response = client.get('/api/v2/products', headers=conditional)
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_products_modified_by_first_write(client, authorize_admin):
+    """the first write after the version sequence is created should change the tag"""
+    headers = authorize_admin
+    with DB.connection(request_scoped=False) as conn:
+        conn.cursor().execute('ALTER SEQUENCE products_version RESTART')
+    response = client.get('/api/v2/products', headers=headers)
+    etag = response.headers['ETag']
+    conditional = dict(headers, **{'If-None-Match': etag})
+
+    client.put('/api/v2/products/{:d}'.format(3), data=json.dumps(PRODUCTS['product15']), headers=headers)
+    response = client.get('/api/v2/products', headers=conditional)
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
 def test_admin_update_product_non_exist(client, authorize_admin):
     """admin should not be able to update a non existent product"""
     headers = authorize_admin
@@ -795,6 +935,32 @@ def test_admin_get_all_sales(client, authorize_admin):
     assert len(data['sales']) == 2
 
 
+def test_admin_export_sales(client, authorize_admin):
+    """admin should be able to export all sales as json lines"""
+    headers = authorize_admin
+
+    response = client.get('/api/v2/sales/export', headers=headers)
+    lines = response.get_data(as_text=True).splitlines()
+    sales = [json.loads(line) for line in lines]
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert [sale['id'] for sale in sales] == [1, 2]
+    assert sales[1]['total'] == 560000
+
+
+def test_attendant_export_sales(client, authorize_attendant):
+    """attendant should not be able to export sales"""
+    headers = authorize_attendant
+    expected_message = 'action failed, user is not administrator'
+
+    response = client.get('/api/v2/sales/export', headers=headers)
+    data = response.json
+
+    assert response.status_code == 401
+    assert data['message'] == expected_message
+
+
 def test_admin_get_single_sale(client, authorize_admin):
     """admin should be able to get a single sale record"""
     headers = authorize_admin
@@ -834,6 +1000,26 @@ def test_admin_get_single_sale(client, authorize_admin):
     assert data == expected_result
 
 
+def test_admin_delete_attendant_with_sales(client, authorize_admin):
+    """admin should not be able to delete an attendant who made sales"""
+    headers = authorize_admin
+
+    response = client.delete('/api/v2/users/{:d}'.format(4), headers=headers)
+    assert response.status_code == 409
+    assert response.json['message'] == 'user has sales'
+    assert client.get('/api/v2/users/{:d}'.format(4), headers=headers).status_code == 200
+
+
+def test_admin_delete_category_with_products(client, authorize_admin):
+    """admin should not be able to delete a category that has products"""
+    headers = authorize_admin
+
+    response = client.delete('/api/v2/categories/{:d}'.format(2), headers=headers)
+    assert response.status_code == 409
+    assert response.json['message'] == 'category has products'
+    assert client.get('/api/v2/categories/{:d}'.format(2), headers=headers).status_code == 200
+
+
 def test_admin_log_out(client, authorize_admin):
     """admin should be able to log out"""
     headers = authorize_admin
@@ -858,3 +1044,263 @@ def test_attendant_log_out(client, authorize_attendant):
 
     assert response.status_code == 200
     assert data['message'] == expected_message
+
+
+def test_product_decrement_stock(client):
+    """stock should not be decremented below the product minimum"""
+    with client.application.test_request_context():
+        with DB.connection() as conn:
+            cur = conn.cursor()
+            # phone has 998 in stock after the sales above and a minimum of 50
+            assert ProductModel.decrement_stock(cur, {2: 948}) == set()
+            assert ProductModel.decrement_stock(cur, {2: 1, 3: 1}) == {2}
+            assert ProductModel.decrement_stock(cur, {20: 1}) == {20}
+            cur.execute('SELECT stock FROM products WHERE id = 2')
+            assert cur.fetchone()[0] == 50
+        DB.end_request()
+
+
+def test_revoked_token_rejected(client, authorize_attendant):
+    """a token should not be usable after logging out with it"""
+    headers = authorize_attendant
+    client.delete('/auth/logout', headers=headers)
+
+    response = client.get('/api/v2/products', headers=headers)
+
+    assert response.status_code == 401
+
+
+def test_token_revoked_elsewhere_rejected(client, authorize_attendant):
+    """a token revoked by another worker should be rejected after a refresh"""
+    headers = authorize_attendant
+    token = headers['Authorization'].split()[1]
+    jti = decode_token(token)['jti']
+    execute_query([REVOKE_TOKEN, (jti,)], "one")
+    REVOKED_TOKENS.refresh()
+
+    response = client.get('/api/v2/products', headers=headers)
+
+    assert response.status_code == 401
+
+
+def test_admin_import_products(client, authorize_admin):
+    """admin should be able to import products, invalid rows are reported"""
+    headers = authorize_admin
+    products = [
+        dict(PRODUCTS['product15'], name='Radio'),
+        dict(PRODUCTS['product15'], name='Speaker', price=-1),
+        PRODUCTS['product15'],
+        dict(PRODUCTS['product15'], name='Tablet', category='toys'),
+        dict(PRODUCTS['product15'], name='radio'),
+        dict(PRODUCTS['product15'], name='Amplifier', price=10 ** 12),
+        dict(PRODUCTS['product15'], name='Mixer', stock='--5'),
+        dict(PRODUCTS['product15'], name='Blender', min_stock='\u00b2'),
+    ]
+    response = client.post('/api/v2/products/import', data=json.dumps(products), headers=headers)
+    data = response.json
+
+    assert response.status_code == 201
+    assert data['imported'] == 1
+    assert data['errors'] == [
+        {'row': 2, 'message': 'price cannot be a negative or 0'},
+        {'row': 3, 'message': 'product already exists'},
+        {'row': 4, 'message': 'category provided does not exist'},
+        {'row': 5, 'message': 'product already exists'},
+        {'row': 6, 'message': 'price is out of range'},
+        {'row': 7, 'message': 'stock should be an integer'},
+        {'row': 8, 'message': 'min_stock should be an integer'},
+    ]
+
+
+def test_admin_import_products_csv(client, authorize_admin):
+    """admin should be able to import products from a CSV file"""
+    headers = dict(authorize_admin, **{'Content-Type': 'text/csv'})
+    rows = ('name,price,description,category,stock,min_stock\n'
+            'Amplifier,4000,"loud, very loud",electronics,10,1\n'
+            'Mixer,a lot,a mixer,electronics,10,1\n')
+    response = client.post('/api/v2/products/import', data=rows, headers=headers)
+    data = response.json
+
+    assert response.status_code == 201
+    assert data['imported'] == 1
+    assert data['errors'] == [{'row': 2, 'message': 'price should be an integer'}]
+
+    product = ProductModel.get_by_name(GET_PRODUCT_BY_NAME, ('amplifier',))
+    assert product[2:5] == (4000, 10, 1)
+
+
+def test_attendant_add_sales_batch(client, authorize_attendant):
+    """attendant should be able to send many sales, failures are reported"""
+    headers = authorize_attendant
+    amplifiers = {'products': [{'name': 'Amplifier', 'count': 4}]}
+    sales = {'sales': [
+        amplifiers,
+        {'products': [{'name': 'amplifier', 'count': 2}, {'name': 'radio', 'count': 1},
+                      {'name': 'amplifier', 'count': 2}]},
+        amplifiers,
+        {'products': [{'name': 'gramophone', 'count': 1}]},
+        {'products': [{'name': 'radio', 'count': 0}]},
+    ]}
+    response = client.post('/api/v2/sales/batch', data=json.dumps(sales), headers=headers)
+    data = response.json
+
+    assert response.status_code == 201
+    assert data['created'] == 2
+    assert data['sales'][2:] == [
+        {'reason': 'cannot sell past minimum stock for amplifier'},
+        {'reason': 'product named gramophone does not exist'},
+        {'reason': 'product count must be 1 and above'},
+    ]
+    assert data['sales'][1]['id'] == data['sales'][0]['id'] + 1
+    product = execute_query([GET_PRODUCT_BY_NAME, ('amplifier',)], "one")
+    assert product[3] == 2
+
+    response = client.get('/api/v2/sales/{:d}'.format(data['sales'][1]['id']), headers=headers)
+    data = response.json
+    assert data['items'] == 5
+    assert data['total'] == 4 * 4000 + 30000
+    assert [p['name'] for p in data['products']] == ['amplifier', 'radio', 'amplifier']
+
+
+def test_admin_sales_report(client, authorize_admin):
+    """the sales report should match the totals of the sale items"""
+    headers = authorize_admin
+    items = execute_query(["""
+        SELECT product_name, SUM(quantity), SUM(total)
+        FROM sale_record_items
+        GROUP BY product_name
+        ORDER BY product_name"""], "many_no_values")
+
+    response = client.get('/api/v2/reports/sales?group_by=product', headers=headers)
+    data = response.json
+
+    assert response.status_code == 200
+    assert [(entry['product'], entry['quantity'], entry['revenue'])
+            for entry in data['report']] == items
+
+    response = client.get('/api/v2/reports/sales', headers=headers)
+    data = response.json
+    assert data['group_by'] == 'day'
+    assert data['report'][-1]['day'] == date_created
+    assert data['report'][-1]['revenue'] == sum(item[2] for item in items)
+
+
+def test_admin_sales_report_invalid(client, authorize_admin):
+    """the sales report should reject unknown groups and dates"""
+    headers = authorize_admin
+    response = client.get('/api/v2/reports/sales?group_by=month', headers=headers)
+    assert response.status_code == 400
+    assert response.json['message'] == 'group_by should be one of day, week, attendant, product'
+
+    response = client.get('/api/v2/reports/sales?from=yesterday', headers=headers)
+    assert response.status_code == 400
+
+
+def test_attendant_get_my_sales(client, authorize_attendant):
+    """attendant should be able to page through the sales they made"""
+    headers = authorize_attendant
+    token = headers['Authorization'].split()[1]
+    attendant_id = decode_token(token)['user_claims']['id']
+    expected = [row[0] for row in execute_query(
+        ["SELECT id FROM sale_records WHERE attendant_id = %s ORDER BY id", (attendant_id,)], "many")]
+
+    response = client.get('/api/v2/sales/mine', headers=headers)
+    data = response.json
+    assert response.status_code == 200
+    assert [sale['id'] for sale in data['sales']] == expected
+
+    response = client.get('/api/v2/sales?attendant_id={}&limit=1'.format(attendant_id), headers=headers)
+    data = response.json
+    assert [sale['id'] for sale in data['sales']] == expected[:1]
+    assert data['next'] == expected[0]
+
+
+def test_get_sales_invalid_attendant(client, authorize_admin):
+    """listing the sales of an attendant should need an integer id"""
+    headers = authorize_admin
+    response = client.get('/api/v2/sales?attendant_id=me', headers=headers)
+
+    assert response.status_code == 400
+    assert response.json['message'] == 'attendant_id should be a positive integer'
+
+
+def test_write_checks_skip_model_cache(client, authorize_admin):
+    """a row deleted by another worker should not be updated from the cache"""
+    headers = authorize_admin
+    category = {'name': 'Seasonal', 'description': 'soon deleted elsewhere'}
+    response = client.post('/api/v2/categories', data=json.dumps(category), headers=headers)
+    category_id = response.json['category']['id']
+    assert client.get('/api/v2/categories/{:d}'.format(category_id), headers=headers).status_code == 200
+
+    with DB.connection(request_scoped=False) as conn:
+        conn.cursor().execute('DELETE FROM categories WHERE id = %s', (category_id,))
+
+    response = client.put('/api/v2/categories/{:d}'.format(category_id), data=json.dumps(category),
+                          headers=headers)
+    assert response.status_code == 404
+    response = client.delete('/api/v2/categories/{:d}'.format(category_id), headers=headers)
+    assert response.status_code == 404
+    response = client.post('/api/v2/categories', data=json.dumps(category), headers=headers)
+    assert response.status_code == 201
+
+
+def test_category_cache_finds_new_category(client, authorize_admin):
+    """a category created by another worker should be found right away"""
+    headers = authorize_admin
+    assert CATEGORY_CACHE.get_by_name('drinks') is None
+
+    with DB.connection(request_scoped=False) as conn:
+        cur = conn.cursor()
+        cur.execute(CREATE_CATEGORY, ('drinks', 'created by another worker'))
+        cur.execute(BUMP_TABLE_VERSION, ('categories',))
+
+    product = dict(PRODUCTS['product15'], name='Juice', category='Drinks')
+    response = client.post('/api/v2/products', data=json.dumps(product), headers=headers)
+    assert response.status_code == 201
+
+
+def test_product_category_deleted_by_another_worker(client, authorize_admin):
+    """a cached category deleted elsewhere should not make product writes fail"""
+    headers = authorize_admin
+    product = dict(PRODUCTS['product15'], name='Rake', category='Garden')
+
+    def cache_then_delete_category():
+        with DB.connection(request_scoped=False) as conn:
+            cur = conn.cursor()
+            cur.execute(CREATE_CATEGORY, ('garden', 'deleted elsewhere'))
+            cur.execute(BUMP_TABLE_VERSION, ('categories',))
+        assert CATEGORY_CACHE.get_by_name('garden') is not None
+        # the version is not bumped, as if the cache had not yet noticed
+        with DB.connection(request_scoped=False) as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM categories WHERE name = 'garden'")
+
+    cache_then_delete_category()
+    response = client.post('/api/v2/products', data=json.dumps(product), headers=headers)
+    assert response.status_code == 400
+    assert response.json['message'] == 'category provided does not exist'
+
+    cache_then_delete_category()
+    response = client.put('/api/v2/products/1', data=json.dumps(product), headers=headers)
+    assert response.status_code == 404
+    assert response.json['message'] == 'category provided does not exist'
+
+
+def test_attendant_add_sale_stock_guard(client, authorize_attendant, monkeypatch):
+    """a sale whose guarded stock update misses should leave nothing behind"""
+    headers = authorize_attendant
+    count_sales = "SELECT count(*) FROM sale_records"
+    sales = execute_query([count_sales], "one")[0]
+    stock = execute_query([GET_PRODUCT_BY_NAME, ('table',)], "one")[3]
+    decrement_stock = ProductModel.decrement_stock
+
+    def decrement_then_miss(cur, quantities):
+        decrement_stock(cur, quantities)
+        return set(quantities)
+
+    monkeypatch.setattr(ProductModel, 'decrement_stock', decrement_then_miss)
+    response = client.post('/api/v2/sales', data=json.dumps(SALE_RECORDS['sale1']), headers=headers)
+    assert response.status_code == 400
+    assert response.json['reason'].startswith('cannot sell past minimum stock')
+    assert execute_query([count_sales], "one")[0] == sales
+    assert execute_query([GET_PRODUCT_BY_NAME, ('table',)], "one")[3] == stock